@@ -1,19 +1,13 @@
 import streamlit as st
 from dotenv import load_dotenv
 import os
-import csv
-import gc
-import io
-import time
-from openpyxl import load_workbook
-from utils.scraper import extract_items, clean_html
-from utils.storage import load_previous_snapshot, save_snapshot, detect_new_items, push_bulk_snapshots
-from utils.fetcher import fetch_html
+from utils.journal import SweepJournal
+from utils.metrics import SweepReport
+from utils.sweep import count_rows, format_report, read_rows, run_sweep, CHANGED, UNCHANGED, ERROR
 
 # --- Load environment variables ---
 load_dotenv()
 PASSWORD = os.getenv("APP_PASSWORD") or st.secrets["APP_PASSWORD"]
-CHUNK_SIZE = 2 # Num of rows processed before pushing to GitHub
 
 # --- Page Config & Styling ---
 st.set_page_config(
@@ -113,7 +107,7 @@ def create_sidebar():
         st.write("Monitor competitor websites for changes.")
         
         st.markdown("### 📊 Required Data Format")
-        st.write("**CSV columns needed:** `Company`, `URL`, `URL Type`")
+        st.write("**CSV or XLSX columns needed:** `Company`, `URL`, `URL Type`")
 
 # --- Session State for Login ---
 if "authenticated" not in st.session_state:
@@ -143,6 +137,8 @@ if "uploader_key" not in st.session_state:
 for key in ["changes", "no_changes", "errors"]:
     if key not in st.session_state:
         st.session_state[key] = []
+if "timing" not in st.session_state:
+    st.session_state.timing = None
 
 if st.session_state.changes or st.session_state.no_changes or st.session_state.errors:
     st.markdown("## Summary")
@@ -167,149 +163,60 @@ if st.session_state.changes or st.session_state.no_changes or st.session_state.e
     else:
         st.markdown("No errors.")
 
+    if st.session_state.timing:
+        with st.expander("Timing"):
+            st.code(st.session_state.timing)
+
 uploaded_file = st.file_uploader(
     "Upload Competitor Configuration File",
-    type=['csv'],
-    help="Upload CSV file containing competitor URLs",
+    type=['csv', 'xlsx'],
+    help="Upload CSV or XLSX file containing competitor URLs",
     key=f"uploaded_file_{st.session_state.uploader_key}"
 )
 
-def csv_row_generator(file):
-    try:
-        text = io.TextIOWrapper(file, encoding="utf-8-sig")
-        reader = csv.DictReader(text)
-        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
-    except Exception as e:
-        st.error(f"Error reading CSV file: {e}")
-        st.stop()
-    # Ensure required columns exist (case-insensitive)
-    required_cols = {"url", "company", "url type"}
-    lower_headers = set(reader.fieldnames)
-    if not required_cols.issubset(lower_headers):
-        st.error(f"Missing required columns: {required_cols - lower_headers}")
-        st.stop()
-    for row in reader:
-        row = {k.strip().lower(): v for k, v in row.items()} # To be safe
-        yield {
-            "url": row["url"],
-            "company": row["company"], 
-            "url type": row["url type"]
-        }
+BUCKETS = {CHANGED: "changes", UNCHANGED: "no_changes", ERROR: "errors"}
+
+def render_result(result):
+    """HTML status line for one sweep result."""
+    c, t = result["company"], result["url_type"]
+    note = " (resumed)" if result.get("resumed") else ""
+    if result["status"] == CHANGED:
+        return f'<div class="status-new">🆕 {c} ({t}) - Changed{note}</div>'
+    if result["status"] == UNCHANGED:
+        return f'<div class="status-success">✅ {c} ({t}) - No Change{note}</div>'
+    return f'<div class="status-error">🚨 {c} ({t}) - {result["message"]}</div>'
+
 if uploaded_file:
     st.write(f"Processing file: {uploaded_file.name}")
 
-    changes, no_changes, errors = [], [], []
-    start = time.time()
-    rows = csv_row_generator(uploaded_file)
-    st.write("File read in", time.time() - start, "seconds")
+    results = {"changes": [], "no_changes": [], "errors": []}
+    try:
+        total = count_rows(uploaded_file, uploaded_file.name)
+        rows = read_rows(uploaded_file, uploaded_file.name)
+    except Exception as e:
+        st.error(f"Error reading file: {e}")
+        st.stop()
     results_container = st.container()
     progress_bar = st.progress(0)
 
-    buffer = []
     total_processed = 0
 
-    # --- Process in chunks ---
-    for row in rows:
-        buffer.append(row)
-        
-        if len(buffer) >= CHUNK_SIZE:
-            for entry in buffer:
-                u, c, t = entry["url"], entry ["company"], entry["url type"]
-                status_box = results_container.empty()
-
-                try:
-                    html, source, status_code = fetch_html(u)
-
-                    if html:
-                        cleaned_html = clean_html(html)
-                        del html # Free memory early
-
-                        items, error = extract_items(cleaned_html, u)
-                        if error:
-                            errors.append(f'<div class="status-error">🚨"⚠️ Could not extract structured content from {c} ({t}): {error}\n"</div>')
-                            continue
-
-                        previous = load_previous_snapshot(c, t)
-                        new_items = detect_new_items(previous, items)
-                        del previous # Free memory
-
-                        if new_items:
-                            changes.append(f'<div class="status-new">🆕 {c} ({t}) - Changed</div>')
-                        # for item in new_items:
-                        #     results_log.append(f"    - {item['title']} ({item['timestamp']})\n")
-                        #     results_log.append(f"      Link: {item['link']}\n")
-                        else:
-                            no_changes.append(f'<div class="status-success">✅ {c} ({t}) - No Change</div>')
-
-                        save_snapshot(c, t, items)
-                        del items
-                        gc.collect()
-                    else:
-                        if status_code == 404:
-                            errors.append(f'<div class="status-error">🚨 {c} ({t}) - Error {status_code}. Website does not exist. </div>')
-                        elif status_code == 403:
-                            errors.append(f'<div class="status-error">🚨 {c} ({t}) - Error {status_code}. Forbidden (bot detected).</div>')
-                        else:
-                            errors.append(f'<div class="status-error">🚨 {c} ({t}) - Error {status_code}. Failed to fetch, please check URL manually.</div>')
-
-                except Exception as error:
-                    errors.append(f'<div class="status-error">🚨 {c} ({t}) - Error {error}</div>')
-                total_processed += 1
-                progress_bar.progress(min(1.0, total_processed / (total_processed + 3)))
-                gc.collect()
-            buffer.clear()
-
-     # Process leftover rows
-    if buffer:
-        for entry in buffer:
-            u, c, t = entry["url"], entry["company"], entry["url type"]
-
-
-            try:
-                html, source, status_code = fetch_html(u)
-
-                if html:
-                    cleaned_html = clean_html(html)
-                    del html # Free memory early
-
-                    items, error = extract_items(cleaned_html, u)
-                    if error:
-                        errors.append(f'<div class="status-error">🚨"⚠️ Could not extract structured content from {c} ({t}): {error}\n"</div>')
-                        continue
-
-                    previous = load_previous_snapshot(c, t)
-                    new_items = detect_new_items(previous, items)
-                    del previous # Free memory
-
-                    if new_items:
-                        changes.append(f'<div class="status-new">🆕 {c} ({t}) - Changed</div>')
-                    else:
-                        no_changes.append(f'<div class="status-success">✅ {c} ({t}) - No Change</div>')
-
-                    save_snapshot(c, t, items)
-                    del items
-                    gc.collect()
-                else:
-                    if status_code == 404:
-                        errors.append(f'<div class="status-error">🚨 {c} ({t}) - Error {status_code}. Website does not exist. </div>')
-                    elif status_code == 403:
-                        errors.append(f'<div class="status-error">🚨 {c} ({t}) - Error {status_code}. Forbidden (bot detected).</div>')
-                    else:
-                        errors.append(f'<div class="status-error">🚨 {c} ({t}) - Error {status_code}. Failed to fetch, please check URL manually.</div>')
-
-            except Exception as error:
-                errors.append(f'<div class="status-error">🚨 {c} ({t}) - Error {error}</div>')
-            total_processed += 1
-            progress_bar.progress(min(1.0, total_processed / (total_processed + 3)))
-            gc.collect()
-
-    push_bulk_snapshots()
+    # --- The sweep engine fetches, parses, diffs and saves; this only renders its results ---
+    # The journal lets a rerun after a crash or restart pick up where this one stopped
+    report = SweepReport()
+    for result in run_sweep(rows, journal=SweepJournal(uploaded_file.name), report=report):
+        message = render_result(result)
+        results[BUCKETS[result["status"]]].append(message)
+        results_container.markdown(message, unsafe_allow_html=True)
+        total_processed += 1
+        progress_bar.progress(min(1.0, total_processed / max(total, 1)), text=f"{total_processed} of {total} rows")
 
     progress_bar.empty()
 
-    st.session_state.changes = changes
-    st.session_state.no_changes = no_changes
-    st.session_state.errors = errors
+    st.session_state.changes = results["changes"]
+    st.session_state.no_changes = results["no_changes"]
+    st.session_state.errors = results["errors"]
+    st.session_state.timing = format_report(report.to_dict()) # Measured over the whole sweep, not just reading the file
 
     # --- Reset uploader but keep results ---
     uploaded_file = None
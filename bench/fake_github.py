@@ -0,0 +1,216 @@
+"""
+A local stand-in for the parts of the GitHub API that delta snapshot sync
+uses: the Git Data API's ref, commit, tree, new commit and ref update
+calls (delta mode), the contents API's file read and write (zip mode), and
+raw file reads.
+
+Repositories live in memory as commits over flat {path: content} trees.
+Point GITHUB_API_URL at base_url and GITHUB_RAW_URL at raw_url to sync
+against it; every API request is kept in requests for inspection:
+
+    python -m bench.fake_github [--port 8801]
+"""
+import argparse
+import base64
+import hashlib
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote
+
+def _sha(kind, payload):
+    return hashlib.sha1(kind.encode() + json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def _blob_sha(data):
+    """The git blob id GitHub reports for a file's bytes."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+def _tree_sha(tree):
+    return _sha("tree", {path: _blob_sha(content) for path, content in tree.items()})
+
+class FakeGitHub:
+    """
+    A threaded HTTP server run on a daemon thread; use as a context manager.
+    Every branch starts at an empty root commit. files(owner, repo, branch)
+    is the tree the branch points at.
+    """
+    ROUTES = [
+        ("GET", re.compile(r"^/repos/([^/]+)/([^/]+)/git/ref/heads/(.+)$"), "_get_ref"),
+        ("GET", re.compile(r"^/repos/([^/]+)/([^/]+)/git/commits/([0-9a-f]+)$"), "_get_commit"),
+        ("POST", re.compile(r"^/repos/([^/]+)/([^/]+)/git/trees$"), "_create_tree"),
+        ("POST", re.compile(r"^/repos/([^/]+)/([^/]+)/git/commits$"), "_create_commit"),
+        ("PATCH", re.compile(r"^/repos/([^/]+)/([^/]+)/git/refs/heads/(.+)$"), "_update_ref"),
+        ("GET", re.compile(r"^/repos/([^/]+)/([^/]+)/contents/(.+)$"), "_get_contents"),
+        ("PUT", re.compile(r"^/repos/([^/]+)/([^/]+)/contents/(.+)$"), "_put_contents"),
+        ("GET", re.compile(r"^/raw/([^/]+)/([^/]+)/([^/]+)/(.+)$"), "_get_raw"),
+    ]
+
+    def __init__(self, host="127.0.0.1", port=0, token=None):
+        self.token = token
+        self.refs = {}     # (owner, repo, branch) -> commit sha
+        self.commits = {}  # sha -> {"tree", "parents", "message"}
+        self.trees = {}    # sha -> {path: content (str, or bytes if written through the contents API)}
+        self.requests = [] # (method, path, json body or None) of every API call
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def raw_url(self):
+        return self.base_url + "/raw"
+
+    def files(self, owner, repo, branch):
+        with self._lock:
+            sha = self._head(owner, repo, branch)
+            return dict(self.trees[self.commits[sha]["tree"]])
+
+    def _head(self, owner, repo, branch):
+        key = (owner, repo, branch)
+        if key not in self.refs:
+            tree_sha = _tree_sha({})
+            self.trees[tree_sha] = {}
+            root = {"tree": tree_sha, "parents": [], "message": "Initial commit"}
+            self.commits[_sha("commit", root)] = root
+            self.refs[key] = _sha("commit", root)
+        return self.refs[key]
+
+    # --- API calls: each gets the path's groups, JSON body and query, and returns (status, body) ---
+    def _get_ref(self, owner, repo, branch, body, query):
+        return 200, {"ref": f"refs/heads/{branch}", "object": {"type": "commit", "sha": self._head(owner, repo, branch)}}
+
+    def _get_commit(self, owner, repo, sha, body, query):
+        commit = self.commits.get(sha)
+        if commit is None:
+            return 404, {"message": "Not Found"}
+        return 200, {"sha": sha, "tree": {"sha": commit["tree"]}, "parents": [{"sha": p} for p in commit["parents"]]}
+
+    def _create_tree(self, owner, repo, body, query):
+        base = self.trees.get(body.get("base_tree"), {}) if body.get("base_tree") else {}
+        tree = dict(base)
+        for entry in body["tree"]:
+            tree[entry["path"]] = entry["content"]
+        sha = _tree_sha(tree)
+        self.trees[sha] = tree
+        return 201, {"sha": sha}
+
+    def _create_commit(self, owner, repo, body, query):
+        if body["tree"] not in self.trees or any(p not in self.commits for p in body["parents"]):
+            return 422, {"message": "Unknown tree or parent"}
+        commit = {"tree": body["tree"], "parents": list(body["parents"]), "message": body["message"]}
+        sha = _sha("commit", commit)
+        self.commits[sha] = commit
+        return 201, {"sha": sha}
+
+    def _update_ref(self, owner, repo, branch, body, query):
+        head = self._head(owner, repo, branch)
+        if head not in self.commits.get(body["sha"], {}).get("parents", []):
+            return 422, {"message": "Update is not a fast forward"}
+        self.refs[(owner, repo, branch)] = body["sha"]
+        return 200, {"ref": f"refs/heads/{branch}", "object": {"type": "commit", "sha": body["sha"]}}
+
+    def _get_contents(self, owner, repo, path, body, query):
+        branch = query.get("ref", "main")
+        content = self.trees[self.commits[self._head(owner, repo, branch)]["tree"]].get(unquote(path))
+        if content is None:
+            return 404, {"message": "Not Found"}
+        data = content if isinstance(content, bytes) else content.encode("utf-8")
+        return 200, {"path": path, "sha": _blob_sha(data), "content": base64.b64encode(data).decode("ascii")}
+
+    def _put_contents(self, owner, repo, path, body, query):
+        path = unquote(path)
+        head = self._head(owner, repo, body.get("branch", "main"))
+        current = self.trees[self.commits[head]["tree"]].get(path)
+        if current is not None and body.get("sha") != _blob_sha(current):
+            return 409, {"message": f"{path} does not match the given sha"}
+        tree = dict(self.trees[self.commits[head]["tree"]])
+        tree[path] = base64.b64decode(body["content"])
+        tree_sha = _tree_sha(tree)
+        self.trees[tree_sha] = tree
+        commit = {"tree": tree_sha, "parents": [head], "message": body["message"]}
+        sha = _sha("commit", commit)
+        self.commits[sha] = commit
+        self.refs[(owner, repo, body.get("branch", "main"))] = sha
+        return 200 if current is not None else 201, {"commit": {"sha": sha}}
+
+    def _get_raw(self, owner, repo, branch, path, body, query):
+        content = self.trees[self.commits[self._head(owner, repo, branch)]["tree"]].get(unquote(path))
+        return (404, "404: Not Found") if content is None else (200, content)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _dispatch(self):
+                path, _, query = self.path.partition("?")
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                for method, pattern, name in server.ROUTES:
+                    match = pattern.match(path)
+                    if method != self.command or not match:
+                        continue
+                    is_api = not path.startswith("/raw/")
+                    if is_api and server.token and self.headers.get("Authorization") != f"token {server.token}":
+                        return self._send(401, {"message": "Bad credentials"})
+                    with server._lock:
+                        if is_api:
+                            server.requests.append((self.command, path, body))
+                        status, payload = getattr(server, name)(*match.groups(), body, dict(parse_qsl(query)))
+                    return self._send(status, payload)
+                self._send(404, {"message": "Not Found"})
+
+            do_GET = do_POST = do_PATCH = do_PUT = _dispatch
+
+            def _send(self, status, payload):
+                if isinstance(payload, (str, bytes)):
+                    data = payload.encode("utf-8") if isinstance(payload, str) else payload
+                    content_type = "application/octet-stream"
+                else:
+                    data = json.dumps(payload).encode("utf-8")
+                    content_type = "application/json"
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-github", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8801)
+    parser.add_argument("--token", help="require this token on API calls")
+    args = parser.parse_args()
+
+    server = FakeGitHub(port=args.port, token=args.token)
+    print(f"GITHUB_API_URL={server.base_url} GITHUB_RAW_URL={server.raw_url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
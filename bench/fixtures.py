@@ -0,0 +1,97 @@
+"""
+Builds the page corpus the offline benchmarks replay (see bench.replay).
+
+A corpus is a directory of HTML files plus manifest.json listing, per page,
+its file, Company, URL Type and original URL. Record real pages once with
+network access, or synthesize a corpus when there is none:
+
+    python -m bench.fixtures record competitors.csv [--out bench/fixtures]
+    python -m bench.fixtures synth [--pages 200] [--items 40] [--out bench/fixtures]
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+
+CORPUS_DIR = os.path.join("bench", "fixtures")
+MANIFEST = "manifest.json"
+
+def _file_name(company, url_type, url):
+    slug = re.sub(r"[^a-z0-9]+", "-", f"{company} {url_type}".lower()).strip("-")[:60]
+    return f"{slug or 'page'}-{hashlib.sha1(url.encode()).hexdigest()[:8]}.html"
+
+def write_corpus(directory, pages):
+    """Writes (company, url_type, url, html) pages and their manifest; returns the manifest."""
+    os.makedirs(directory, exist_ok=True)
+    manifest = []
+    for company, url_type, url, html in pages:
+        name = _file_name(company, url_type, url)
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            f.write(html)
+        manifest.append({"file": name, "company": company, "url type": url_type, "url": url, "bytes": len(html.encode())})
+    with open(os.path.join(directory, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+def load_corpus(directory=CORPUS_DIR):
+    """Returns [(entry, html)] for every page in the corpus manifest."""
+    with open(os.path.join(directory, MANIFEST), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    corpus = []
+    for entry in manifest:
+        with open(os.path.join(directory, entry["file"]), "r", encoding="utf-8", errors="ignore") as f:
+            corpus.append((entry, f.read()))
+    return corpus
+
+def record(sheet, directory=CORPUS_DIR):
+    """Fetches every row of a config sheet once and saves the pages that came back."""
+    from utils.fetcher import fetch_html
+    from utils.sweep import read_rows
+
+    pages = []
+    for row in read_rows(sheet):
+        html, source, status_code = fetch_html(row["url"], conditional=False)
+        if html is None:
+            print(f"⚠️ Skipped {row['url']}: {status_code or source}")
+            continue
+        pages.append((row["company"], row["url type"], row["url"], html))
+    return write_corpus(directory, pages)
+
+def synthesize(directory=CORPUS_DIR, count=200, items=40, seed=0):
+    """A corpus of IR-style pages with made-up press releases, for when nothing was recorded."""
+    from bench.parse_backends import render_snapshot_page
+
+    rng = random.Random(seed)
+    pages = []
+    for i in range(count):
+        page_items = [
+            {
+                "title": f"Company {i} announces result {rng.randrange(10 ** 6)} for quarter {n % 4 + 1}",
+                "link": f"https://company{i}.example/news/{n}",
+                "timestamp": f"20{rng.randrange(15, 26)}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}",
+            }
+            for n in range(rng.randrange(items // 2, items + 1))
+        ]
+        pages.append((f"Company {i}", "Press Releases", f"https://company{i}.example/news", render_snapshot_page(page_items)))
+    return write_corpus(directory, pages)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="fetch the pages of a config sheet")
+    record_parser.add_argument("sheet")
+    synth_parser = commands.add_parser("synth", help="generate pages without network access")
+    synth_parser.add_argument("--pages", type=int, default=200)
+    synth_parser.add_argument("--items", type=int, default=40)
+    synth_parser.add_argument("--seed", type=int, default=0)
+    for command in (record_parser, synth_parser):
+        command.add_argument("--out", default=CORPUS_DIR)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        manifest = record(args.sheet, args.out)
+    else:
+        manifest = synthesize(args.out, args.pages, args.items, args.seed)
+    print(f"✅ {len(manifest)} page(s), {sum(e['bytes'] for e in manifest) / 1e6:.1f} MB in {args.out}")
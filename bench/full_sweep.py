@@ -0,0 +1,120 @@
+"""
+Times full sweeps (fetch_html -> extract_page -> save_snapshot) over a
+fixture corpus served by the local replay server, with no network access.
+
+The sweep runs in a scratch directory with local-only snapshots, so real
+snapshots and fetch state are never touched. Every page is served from one
+host, so per-host politeness delays are off unless set in the environment.
+The first pass stores every page; later passes exercise conditional fetches
+and the unchanged path. Reports throughput, p50/p95 per stage and peak memory:
+
+    python -m bench.full_sweep [--corpus bench/fixtures] [--passes 2] [--latency 0.05]
+        [--forbidden 0.05] [--missing 0.05] [--challenge 0.05] [--tracemalloc] [--json]
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+from bench.fixtures import CORPUS_DIR, load_corpus, synthesize
+from bench.replay import ReplayServer
+
+# Defaults for the sweep's settings, read when utils is first imported
+BENCH_ENV = {
+    "SNAPSHOT_REMOTE": "none",
+    "SNAPSHOT_BACKEND": "sqlite",
+    "HOST_MIN_DELAY": "0",
+    "HOST_RATE": "1000",
+    "HOST_BURST": "1000",
+    "HOST_CONCURRENCY": "64",
+    "PARSE_WORKERS": "0", # Parse inline so the extract stage is timed too
+}
+
+def configure():
+    """Applies BENCH_ENV where the environment does not override it. Call before importing utils."""
+    for name, value in BENCH_ENV.items():
+        os.environ.setdefault(name, value)
+
+def run_pass(run_sweep, SweepReport, rows, server, trace):
+    report = SweepReport(trace=trace)
+    bytes_before = server.bytes_sent
+    for _ in run_sweep(rows, push=False, report=report):
+        pass
+    result = report.to_dict()
+    result["mb_downloaded"] = round((server.bytes_sent - bytes_before) / 1e6, 2)
+    return result
+
+def run(corpus, passes=2, trace=False, **server_options):
+    configure()
+    workdir = tempfile.mkdtemp(prefix="sweep-bench-")
+    cwd = os.getcwd()
+    os.chdir(workdir) # utils keep their data/ paths relative to the working directory
+    try:
+        # Imported here so BENCH_ENV applies
+        import utils.pipeline
+        from utils.metrics import SweepReport
+        from utils.sweep import run_sweep
+
+        reports = []
+        with ReplayServer(corpus, **server_options) as server:
+            rows = [
+                {"company": entry["company"], "url type": entry["url type"], "url": server.url(entry)}
+                for entry, _ in corpus
+            ]
+            for _ in range(passes):
+                reports.append(run_pass(run_sweep, SweepReport, rows, server, trace))
+        return {
+            "pages": len(corpus),
+            "corpus_mb": round(sum(entry["bytes"] for entry, _ in corpus) / 1e6, 2),
+            "parse_workers": utils.pipeline.PARSE_WORKERS,
+            "stream_parsing": utils.pipeline.STREAM_PARSING,
+            "passes": reports,
+        }
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def print_report(report):
+    print(f"{report['pages']} page(s), {report['corpus_mb']} MB, parse_workers={report['parse_workers']}")
+    for number, result in enumerate(report["passes"], 1):
+        statuses = ", ".join(f"{count} {status}" for status, count in sorted(result["statuses"].items()))
+        print(f"\nPass {number}: {result['seconds']} s, {result['rows_per_second']} rows/s, "
+              f"{result['mb_downloaded']} MB downloaded ({statuses})")
+        print(f"{'stage':<18} {'calls':>6} {'total s':>9} {'p50 ms':>9} {'p95 ms':>9}")
+        for stage, stats in result["stages"].items():
+            print(f"{stage:<18} {stats['calls']:>6} {stats['total_s']:>9.2f} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f}")
+        peak = "" if result["peak_traced_mb"] is None else f"traced peak {result['peak_traced_mb']} MB, "
+        print(f"Memory: {peak}max RSS {result['max_rss_mb']} MB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", default=CORPUS_DIR, help="fixture directory (see bench.fixtures)")
+    parser.add_argument("--synth", type=int, default=0, help="sweep N synthesized pages instead of a corpus")
+    parser.add_argument("--passes", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--forbidden", type=float, default=0.0, help="fraction of pages served as 403")
+    parser.add_argument("--missing", type=float, default=0.0, help="fraction of pages served as 404")
+    parser.add_argument("--challenge", type=float, default=0.0, help="fraction of pages served as a challenge")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tracemalloc", action="store_true", help="also trace Python allocations (slower)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+    configure()
+
+    if args.synth:
+        corpus_dir = tempfile.mkdtemp(prefix="sweep-corpus-")
+        synthesize(corpus_dir, args.synth, seed=args.seed)
+        corpus = load_corpus(corpus_dir)
+        shutil.rmtree(corpus_dir, ignore_errors=True)
+    else:
+        corpus = load_corpus(args.corpus)
+
+    report = run(
+        corpus, args.passes, args.tracemalloc, latency=args.latency, jitter=args.jitter,
+        forbidden=args.forbidden, missing=args.missing, challenge=args.challenge, seed=args.seed,
+    )
+    if args.json:
+        print(json.dumps(report, indent=1))
+    else:
+        print_report(report)
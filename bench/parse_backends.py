@@ -0,0 +1,63 @@
+"""
+Times parse_html and extract_items_from_document per parser backend.
+
+Pages come from HTML files given on the command line or, by default, are
+rebuilt from every snapshot we already store (one <li> per saved item
+inside the usual nav/main/footer chrome), so no network is needed.
+
+    python -m bench.parse_backends [page.html ...] [--repeat N]
+"""
+import argparse
+import time
+from html import escape
+from utils.scraper import available_parsers, extract_items_from_document, parse_html
+from utils.storage import SNAPSHOT_STORE
+
+def render_snapshot_page(items):
+    """An IR-style page containing the given snapshot items."""
+    rows = "".join(
+        f'<li class="item"><div class="card"><div class="title">'
+        f'<a href="{escape(item.get("link", ""))}">{escape(item.get("title", ""))}</a></div>'
+        f'<span class="date">{escape(item.get("timestamp", ""))}</span></div></li>'
+        for item in items
+    )
+    return (
+        "<html><head><script>var x = '2020-01-01';</script><style>.a{}</style></head><body>"
+        "<nav><ul><li><a href='#main'>Skip to main content</a></li><li><a href='/'>Home</a></li></ul></nav>"
+        f"<main id='main'><div class='wrap'><div class='inner'><section><ul>{rows}</ul></section></div></div></main>"
+        "<footer><p>Cookie settings</p></footer></body></html>"
+    )
+
+def load_pages(paths):
+    if paths:
+        pages = []
+        for path in paths:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                pages.append((path, f.read()))
+        return pages
+    return [(key, render_snapshot_page(items)) for key, items in SNAPSHOT_STORE.items() if items]
+
+def run(pages, repeat=1):
+    print(f"{len(pages)} page(s), {sum(len(html) for _, html in pages) / 1e6:.1f} MB, repeat={repeat}")
+    print(f"{'backend':<12} {'parse s':>9} {'extract s':>10} {'ms/page':>9} {'items':>8}")
+    for backend in available_parsers():
+        parse_time = extract_time = 0.0
+        item_count = 0
+        for _ in range(repeat):
+            for _, html in pages:
+                started = time.perf_counter()
+                parsed = parse_html(html, backend)
+                parsed_at = time.perf_counter()
+                items, _ = extract_items_from_document(parsed, "https://example.com/")
+                extract_time += time.perf_counter() - parsed_at
+                parse_time += parsed_at - started
+                item_count += len(items)
+        per_page = (parse_time + extract_time) / (len(pages) * repeat) * 1000
+        print(f"{backend:<12} {parse_time:>9.2f} {extract_time:>10.2f} {per_page:>9.1f} {item_count // repeat:>8}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("pages", nargs="*", help="HTML files (default: pages rebuilt from stored snapshots)")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+    run(load_pages(args.pages), args.repeat)
@@ -0,0 +1,149 @@
+"""
+Serves a fixture corpus (see bench.fixtures) over local HTTP, so sweeps can
+be measured without the network.
+
+Each page is served at /<file> with an ETag (conditional requests get 304s).
+Responses are delayed by latency +- jitter seconds, and given fractions of
+the pages, picked reproducibly from seed, are replaced by a 403, a 404 or a
+Cloudflare-style "Just a moment" challenge page (served with a 200, like the
+ones curl_cffi is turned away with):
+
+    python -m bench.replay [--corpus bench/fixtures] [--port 8800] [--latency 0.2] [--challenge 0.05]
+"""
+import argparse
+import hashlib
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from bench.fixtures import CORPUS_DIR, load_corpus
+
+CHALLENGE_PAGE = (
+    "<!DOCTYPE html><html><head><title>Just a moment...</title></head><body>"
+    "<h1>Checking your browser before accessing the website.</h1>"
+    "<noscript>Please enable JavaScript and cookies to continue.</noscript></body></html>"
+)
+FORBIDDEN = "forbidden"
+MISSING = "missing"
+CHALLENGE = "challenge"
+
+def assign_faults(names, forbidden=0.0, missing=0.0, challenge=0.0, seed=0):
+    """Maps a reproducible sample of page names to the fault they are served with."""
+    names = sorted(names)
+    random.Random(seed).shuffle(names)
+    faults, start = {}, 0
+    for fault, rate in ((FORBIDDEN, forbidden), (MISSING, missing), (CHALLENGE, challenge)):
+        count = round(rate * len(names))
+        faults.update((name, fault) for name in names[start:start + count])
+        start += count
+    return faults
+
+class ReplayServer:
+    """
+    A threaded HTTP server over [(entry, html)] pages, run on a daemon thread.
+    Use as a context manager; url(entry) is where a page is served.
+    """
+    def __init__(self, corpus, host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                 forbidden=0.0, missing=0.0, challenge=0.0, seed=0):
+        self.pages = {}
+        for entry, html in corpus:
+            body = html.encode("utf-8")
+            self.pages["/" + entry["file"]] = (body, '"' + hashlib.sha1(body).hexdigest() + '"')
+        self.faults = assign_faults(self.pages, forbidden, missing, challenge, seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, entry):
+        return f"{self.base_url}/{entry['file']}"
+
+    def _delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                server._delay()
+                path = self.path.split("?", 1)[0]
+                page = server.pages.get(path)
+                fault = server.faults.get(path)
+                if page is None or fault == MISSING:
+                    return self._send(404, b"<html><body>Not found</body></html>")
+                if fault == FORBIDDEN:
+                    return self._send(403, b"<html><body>Access denied</body></html>")
+                if fault == CHALLENGE:
+                    return self._send(200, CHALLENGE_PAGE.encode())
+                body, etag = page
+                if self.headers.get("If-None-Match") == etag:
+                    return self._send(304, b"", etag)
+                self._send(200, body, etag)
+
+            def _send(self, status, body, etag=None):
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                if etag:
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+                with server._lock:
+                    server.bytes_sent += len(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="replay-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", default=CORPUS_DIR)
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+- seconds of random latency")
+    parser.add_argument("--forbidden", type=float, default=0.0, help="fraction of pages served as 403")
+    parser.add_argument("--missing", type=float, default=0.0, help="fraction of pages served as 404")
+    parser.add_argument("--challenge", type=float, default=0.0, help="fraction of pages served as a challenge")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    server = ReplayServer(
+        corpus, port=args.port, latency=args.latency, jitter=args.jitter,
+        forbidden=args.forbidden, missing=args.missing, challenge=args.challenge, seed=args.seed,
+    )
+    print(f"Serving {len(corpus)} page(s) at {server.base_url}/ (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
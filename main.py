@@ -1,11 +1,12 @@
-from flask import Flask, render_template, request, redirect, url_for, session
+from flask import Flask, Response, abort, jsonify, render_template, request, redirect, stream_with_context, url_for, session
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
-import pandas as pd
+import json
 import os
-from utils.scraper import extract_items, clean_html
-from utils.storage import load_previous_snapshot, save_snapshot, detect_new_items
-from utils.fetcher import fetch_html
+import uuid
+from utils.jobs import JOBS, FINISHED_STATES, QueueFull
+from utils.metrics import METRICS
+from utils.sweep import count_rows, format_text, read_rows
 
 # Load environment variables from .env file
 load_dotenv()
@@ -13,6 +14,7 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
 PASSWORD = os.getenv("APP_PASSWORD")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") # If set, /metrics requires "Authorization: Bearer <token>"
 UPLOAD_FOLDER = 'uploads'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
@@ -44,69 +46,95 @@ def upload_file():
     if file.filename == '':
         return render_template("submit.html", results="No selected file")
 
-    excelpath = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
+    # Unique name so sweeps queued at the same time never share an upload
+    excelpath = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex[:8]}_{secure_filename(file.filename)}")
     file.save(excelpath)
 
-    # Load Excel file
-    df = pd.read_excel(excelpath)
-
-    results = ""
-
-    # Check for URL column
-    if 'URL' not in df.columns:
-        raise ValueError("Expected a column named URL in the sheet.")
-
-
-    # Loop through each link in the URL column
-    for index, row in df.iterrows():
-        url = row['URL']
-        company_name = row['Company']
-        url_type = row['URL Type']
-
-        results += f"\nAccessing ({company_name}, {url_type}): {url}\n"
-
-        try:
-            html, source, status_code = fetch_html(url)
-            cleaned_html = clean_html(html)
-
-
-
-            if html:
-                results += f"Success ({source}): {company_name}\n"
-
-                items, error = extract_items(cleaned_html, url)
-
-                if error:
-                    results += f"  ⚠️ Could not extract structured content: {error}\n"
-                    continue
+    # Rows are read lazily as the sweep goes; the count is only for progress
+    try:
+        total = count_rows(excelpath)
+        rows = read_rows(excelpath)
+    except ValueError as e:
+        return render_template("submit.html", results=str(e))
+
+    # Sweep in the background; the job page polls for results
+    try:
+        job = JOBS.submit(rows, label=file.filename, total=total)
+    except QueueFull as e:
+        return render_template("submit.html", results=f"Too many sweeps queued, try again later ({e})."), 429
+
+    return redirect(url_for("job_page", job_id=job.id))
+
+# --- Sweep jobs ---
+def _job_or_404(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        abort(404)
+    return job
+
+def _job_payload(snapshot):
+    snapshot["text"] = [format_text(result) for result in snapshot["results"]]
+    return snapshot
+
+@app.route('/jobs/<job_id>')
+def job_page(job_id):
+    if not session.get("authenticated"):
+        return redirect(url_for("login"))
+    return render_template("job.html", job=_job_payload(_job_or_404(job_id).snapshot()))
 
-                previous = load_previous_snapshot(company_name, url_type)
-                new_items = detect_new_items(previous, items)
+@app.route('/jobs/<job_id>/status')
+def job_status(job_id):
+    """Job state plus the results from ?since=N on, for polling."""
+    if not session.get("authenticated"):
+        abort(401)
+    since = request.args.get("since", 0, type=int)
+    return jsonify(_job_payload(_job_or_404(job_id).snapshot(since)))
 
-                if new_items:
-                    results += f"  🆕 {len(new_items)} new item(s) found:\n"
-                    for item in new_items:
-                        results += f"    - {item['title']} ({item['timestamp']})\n"
-                        results += f"      Link: {item['link']}\n"
-                else:
-                    results += "  ✅ No new content since last check.\n"
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-sent events: one message per batch of new results until the job finishes."""
+    if not session.get("authenticated"):
+        abort(401)
+    job = _job_or_404(job_id)
+    since = request.args.get("since", 0, type=int)
+
+    def stream():
+        nonlocal since
+        while True:
+            snapshot = job.wait(since, timeout=15)
+            if snapshot["results"] or snapshot["state"] in FINISHED_STATES:
+                yield f"data: {json.dumps(_job_payload(snapshot))}\n\n"
+                since = snapshot["processed"]
+            else:
+                yield ": keep-alive\n\n"
+            if snapshot["state"] in FINISHED_STATES:
+                return
 
-                save_snapshot(company_name, url_type, items)
+    return Response(stream_with_context(stream()), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
 
-            else:
-                if status_code == 404: # Common errors
-                    results += f" 🚨 Failure: Status code {status_code}. Website does not exist.\n"
-                elif status_code == 403:
-                    results += f" 🚨 Failure: Status code {status_code}. Forbidden (bot detected).\n"
-                elif status_code:
-                    results += f" 🚨 Failure: Status code {status_code}. Please check manually.\n"
-                else:
-                    results += f" 🚨 Failed to fetch {url}. Please check URL address. Finding: {error} \n"
-
-        except Exception as error:
-            results += f" 🚨 Failed to fetch {url} from spreadsheet: {error}\n"
-
-    return render_template('index.html', results=results)
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def job_cancel(job_id):
+    if not session.get("authenticated"):
+        abort(401)
+    if JOBS.cancel(job_id) is None:
+        abort(404)
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify({"id": job_id, "cancelling": True})
+    return redirect(url_for("job_page", job_id=job_id))
+
+@app.route('/jobs/<job_id>/report')
+def job_report(job_id):
+    """The sweep's stage timings, counters and peak memory so far (final once it finishes)."""
+    if not session.get("authenticated"):
+        abort(401)
+    return jsonify(_job_or_404(job_id).report.to_dict())
+
+@app.route('/metrics')
+def metrics():
+    """Sweep counters and stage timings since startup, for Prometheus to scrape."""
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        abort(401)
+    return Response(METRICS.prometheus(), mimetype="text/plain; version=0.0.4")
 
 @app.route("/logout")
 def logout():
@@ -0,0 +1,21 @@
+# To run the tests against scratch data: local-only snapshots, no politeness delays, a temporary working directory
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT) # Absolute, so imports still resolve after the chdir below
+
+# Read when utils is first imported, so set before any test module imports it (as bench.full_sweep does)
+for name, value in {
+    "SNAPSHOT_REMOTE": "none",
+    "SNAPSHOT_BACKEND": "sqlite",
+    "HOST_MIN_DELAY": "0",
+    "HOST_RATE": "1000",
+    "HOST_BURST": "1000",
+    "PARSE_WORKERS": "0",
+}.items():
+    os.environ.setdefault(name, value)
+
+# utils keep their data/ paths relative to the working directory
+os.chdir(tempfile.mkdtemp(prefix="sweep-tests-"))
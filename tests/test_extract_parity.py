@@ -0,0 +1,88 @@
+# To check that the single-pass extract_items returns exactly what the original implementation did
+import random
+import re
+from urllib.parse import urljoin
+import pytest
+from bs4 import BeautifulSoup
+from utils.scraper import clean_html, extract_items
+
+BASE_URL = "https://example.com/investors/"
+
+def baseline_extract_items(html_content, base_url):
+    """extract_items as it was before the single-pass rewrite, kept verbatim as the reference."""
+    junk_keywords = ["skip", "main menu", "footer", "cookie"]
+    soup = BeautifulSoup(html_content, 'html.parser')
+    items = []
+
+    candidates = soup.find_all(['article', 'li', 'tr', 'div', 'section', 'p'])
+
+    for tag in candidates:
+        text = tag.get_text(strip=True)
+        if not text or any(j in text.lower() for j in junk_keywords):
+            continue
+
+        link_tag = tag.find('a')
+        date_match = re.search(r'(\d{4}[-/]\d{1,2}[-/]\d{1,2})', text)
+
+        if link_tag and text:
+            raw_link = link_tag.get('href')
+            full_link = urljoin(base_url, raw_link) if raw_link else base_url
+
+            items.append({
+                "title": text[:150],
+                "link": full_link,
+                "timestamp": date_match.group(0) if date_match else "unknown"
+            })
+
+    if not items:
+        return [], "No extractable content found (unsupported structure)"
+
+    return items, None
+
+# --- Generated documents ---
+BLOCK_TAGS = ["article", "li", "tr", "div", "section", "p", "span", "ul", "td", "b"]
+WORDS = [
+    "Quarterly", "results", "AbbVie", "Skip", "to", "content", "Press",
+    "release", "2024-05-01", "2023/1/9", "12:45 PM", "Published on", "42", "&amp;", "&#8217;s", " ", "\n  ",
+]
+
+def _text(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 6)))
+
+def _node(rng, depth):
+    roll = rng.random()
+    if depth > 5 or roll < 0.2:
+        return _text(rng)
+    if roll < 0.45:
+        href = rng.choice(["/news/1", "release-2024.pdf", "https://other.example/x", "", None])
+        attr = "" if href is None else f" href='{href}'"
+        return f"<a{attr}>{_text(rng)}</a>"
+    if roll < 0.5:
+        return f"<script>var x = '{_text(rng)}';</script>"
+    tag = rng.choice(BLOCK_TAGS)
+    children = "".join(_node(rng, depth + 1) for _ in range(rng.randint(0, 4)))
+    return f"<{tag}>{children}</{tag}>"
+
+def generated_documents(count, seed=0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        body = "".join(_node(rng, 0) for _ in range(rng.randint(1, 6)))
+        yield f"<html><head><title>{_text(rng)}</title></head><body>{body}</body></html>"
+
+@pytest.mark.parametrize("cleaned", [False, True], ids=["raw", "clean_html"])
+def test_matches_baseline_on_generated_documents(cleaned):
+    for html in generated_documents(500, seed=int(cleaned)):
+        if cleaned:
+            html = clean_html(html)
+        assert extract_items(html, BASE_URL, parser="html.parser") == baseline_extract_items(html, BASE_URL), html
+
+def test_matches_baseline_on_a_listing():
+    html = (
+        "<div><a href='/skip'>Skip to content</a></div>"
+        "<ul><li><a href='/news/q3'>Q3 results</a> 2024-10-30</li>"
+        "<li><p>No link here</p></li>"
+        "<li><a>Annual report</a><span>2024/3/1</span></li></ul>"
+    )
+    items, error = extract_items(html, BASE_URL, parser="html.parser")
+    assert (items, error) == baseline_extract_items(html, BASE_URL)
+    assert [item["timestamp"] for item in items] == ["2024-10-30", "2024/3/1"]
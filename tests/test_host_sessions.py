@@ -0,0 +1,27 @@
+# To check that pooled per-host sessions are capped and closed once idle, but never while in use
+from utils.fetcher import HostScheduler
+
+def open_session(scheduler, host):
+    with scheduler.slot(f"https://{host}/") as name:
+        return scheduler.session(name)
+
+def pooled(scheduler):
+    return sorted(host for host, state in scheduler._hosts.items() if state.session is not None)
+
+def test_least_recently_used_sessions_beyond_the_cap_are_closed():
+    scheduler = HostScheduler(policies={}, max_sessions=2)
+    for host in ("a.example", "b.example", "a.example", "c.example"):
+        open_session(scheduler, host)
+    assert pooled(scheduler) == ["a.example", "c.example"]
+    scheduler.close()
+
+def test_idle_sessions_are_closed_but_busy_ones_kept():
+    scheduler = HostScheduler(policies={}, idle_ttl=0)
+    with scheduler.slot("https://busy.example/") as busy:
+        first = scheduler.session(busy)
+        open_session(scheduler, "other.example")
+        open_session(scheduler, "new.example")
+        assert scheduler.session(busy) is first # In use the whole time
+    assert pooled(scheduler) == ["busy.example", "new.example"]
+    scheduler.close()
+    assert pooled(scheduler) == []
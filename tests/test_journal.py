@@ -0,0 +1,57 @@
+# To check that an interrupted sweep resumes from its journal, and that a restart sweeps every row again
+import pytest
+from bench.fixtures import load_corpus, synthesize
+from bench.replay import ReplayServer
+from utils import storage
+from utils.journal import SweepJournal
+from utils.sweep import run_sweep
+
+@pytest.fixture
+def site(tmp_path):
+    synthesize(str(tmp_path / "corpus"), 6, items=5, seed=3)
+    corpus = load_corpus(str(tmp_path / "corpus"))
+    with ReplayServer(corpus) as server:
+        rows = [
+            {"company": entry["company"], "url type": entry["url type"], "url": server.url(entry)}
+            for entry, _ in corpus
+        ]
+        yield server, rows
+
+def interrupted_sweep(rows, journal, finished_rows):
+    sweep = run_sweep(rows, push=False, journal=journal)
+    finished = [next(sweep) for _ in range(finished_rows)]
+    sweep.close() # As if the process died here
+    return finished
+
+def test_resume_skips_finished_rows(site, tmp_path):
+    server, rows = site
+    interrupted_sweep(rows, SweepJournal("sheet", directory=str(tmp_path)), 2)
+    requests = server.requests
+
+    results = list(run_sweep(rows, push=False, journal=SweepJournal("sheet", directory=str(tmp_path))))
+    assert sum(result["resumed"] for result in results) == 2
+    assert len(results) == len(rows)
+    assert server.requests - requests == len(rows) - 2
+
+def test_restart_refetches_every_row(site, tmp_path):
+    server, rows = site
+    interrupted_sweep(rows, SweepJournal("sheet", directory=str(tmp_path)), 2)
+    requests = server.requests
+
+    journal = SweepJournal("sheet", directory=str(tmp_path))
+    journal.reset()
+    results = list(run_sweep(rows, push=False, journal=journal))
+    assert not any(result["resumed"] for result in results)
+    assert server.requests - requests == len(rows)
+
+def test_resume_keeps_newer_stored_snapshot(site, tmp_path):
+    server, rows = site
+    finished = interrupted_sweep(rows, SweepJournal("sheet", directory=str(tmp_path)), 2)
+    key = storage.get_snapshot_key(finished[0]["company"], finished[0]["url_type"])
+    newer = [{"title": "Saved since", "link": "https://example.com/since", "timestamp": "unknown"}]
+    storage.SNAPSHOT_STORE.put(key, newer)
+    storage.UPDATED_FILES.clear() # As after a restart
+
+    list(run_sweep(rows, push=False, journal=SweepJournal("sheet", directory=str(tmp_path))))
+    assert storage.SNAPSHOT_STORE.get(key) == newer # Not rolled back to the checkpoint
+    assert key in storage.UPDATED_FILES # But still staged for the push
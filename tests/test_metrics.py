@@ -0,0 +1,33 @@
+# To check that each sweep's report only counts its own work, fetch threads included
+import threading
+from bench.fixtures import load_corpus, synthesize
+from bench.replay import ReplayServer
+from utils.metrics import METRICS, SweepReport
+from utils.sweep import run_sweep
+
+def test_overlapping_recordings_stay_apart(tmp_path):
+    synthesize(str(tmp_path / "corpus"), 4, items=3, seed=5)
+    corpus = load_corpus(str(tmp_path / "corpus"))
+    opened, swept = threading.Event(), threading.Event()
+    other = {}
+
+    def other_sweep(): # Another job's sweep, open for the whole of this one
+        with METRICS.recording() as recorder:
+            opened.set()
+            swept.wait()
+            other.update(recorder.export()["counters"])
+
+    thread = threading.Thread(target=other_sweep)
+    thread.start()
+    opened.wait()
+    fetches = METRICS.totals.counters.get("fetches", 0)
+    with ReplayServer(corpus) as server:
+        rows = [{"company": entry["company"], "url type": entry["url type"], "url": server.url(entry)} for entry, _ in corpus]
+        report = SweepReport()
+        list(run_sweep(rows, push=False, report=report))
+    swept.set()
+    thread.join()
+
+    assert report.to_dict()["counters"]["fetches"] == len(rows) # Counted on the fetch threads
+    assert "fetches" not in other
+    assert METRICS.totals.counters["fetches"] - fetches == len(rows)
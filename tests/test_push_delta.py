@@ -0,0 +1,82 @@
+# To check delta and zip snapshot sync against a local stand-in for the GitHub API
+import json
+import pytest
+from bench.fake_github import FakeGitHub
+from utils.backends import GitHubBackend, SQLiteBackend
+
+OWNER, REPO, BRANCH, TOKEN = "acme", "snapshots", "main", "test-token"
+
+def snapshot(title):
+    return [{"title": title, "link": "https://example.com/news", "timestamp": "unknown"}]
+
+@pytest.fixture
+def github():
+    with FakeGitHub(token=TOKEN) as server:
+        yield server
+
+def make_remote(server, tmp_path, sync_mode="delta"):
+    return GitHubBackend(
+        OWNER, REPO, BRANCH, TOKEN, server.base_url, server.raw_url,
+        zip_path="snapshots.zip", files_dir="snapshots", sync_mode=sync_mode,
+        state_path=str(tmp_path / "github_sync.json"),
+    )
+
+def pushed_paths(server):
+    """Paths sent in each tree the remote received."""
+    return [sorted(entry["path"] for entry in body["tree"]) for method, path, body in server.requests if path.endswith("/git/trees")]
+
+def test_push_sends_only_changed_keys(github, tmp_path):
+    local = SQLiteBackend(str(tmp_path / "snapshots.db"))
+    remote = make_remote(github, tmp_path)
+    local.put("A_News.json", snapshot("First"))
+    local.put("B_News.json", snapshot("Second"))
+
+    assert remote.push({"A_News.json", "B_News.json"}, local)
+    local.put("A_News.json", snapshot("First, revised"))
+    assert remote.push({"A_News.json", "B_News.json"}, local)
+
+    assert pushed_paths(github) == [["snapshots/A_News.json", "snapshots/B_News.json"], ["snapshots/A_News.json"]]
+    files = github.files(OWNER, REPO, BRANCH)
+    assert json.loads(files["snapshots/A_News.json"]) == snapshot("First, revised")
+    assert json.loads(files["snapshots/B_News.json"]) == snapshot("Second")
+    assert remote.get("B_News.json") == snapshot("Second") # Read back through the raw URL
+
+def test_unchanged_push_makes_no_requests(github, tmp_path):
+    local = SQLiteBackend(str(tmp_path / "snapshots.db"))
+    remote = make_remote(github, tmp_path)
+    local.put("A_News.json", snapshot("First"))
+    assert remote.push({"A_News.json"}, local)
+    sent = len(github.requests)
+
+    assert remote.push({"A_News.json"}, local)
+    assert len(github.requests) == sent
+
+def test_failed_push_is_retried(github, tmp_path):
+    local = SQLiteBackend(str(tmp_path / "snapshots.db"))
+    remote = make_remote(github, tmp_path)
+    local.put("A_News.json", snapshot("First"))
+
+    remote.token = "wrong"
+    assert not remote.push({"A_News.json"}, local)
+    remote.token = TOKEN
+    assert remote.push({"A_News.json"}, local)
+    assert "snapshots/A_News.json" in github.files(OWNER, REPO, BRANCH)
+
+def test_zip_push_skips_unchanged_zip(github, tmp_path):
+    local = SQLiteBackend(str(tmp_path / "snapshots.db"))
+    remote = make_remote(github, tmp_path, sync_mode="zip")
+    local.put("A_News.json", snapshot("First"))
+
+    assert remote.push({"A_News.json"}, local)
+    assert remote.push({"A_News.json"}, local)
+    assert [method for method, path, body in github.requests] == ["GET", "PUT", "GET"]
+    assert "snapshots.zip" in github.files(OWNER, REPO, BRANCH)
+
+@pytest.mark.parametrize("sync_mode", ["delta", "zip"])
+def test_unreachable_remote_fails_push(github, tmp_path, sync_mode):
+    local = SQLiteBackend(str(tmp_path / "snapshots.db"))
+    remote = make_remote(github, tmp_path, sync_mode=sync_mode)
+    local.put("A_News.json", snapshot("First"))
+
+    github.stop()
+    assert not remote.push({"A_News.json"}, local) # Returns instead of raising on the push thread
@@ -1,49 +1,642 @@
 # To access a site
+import os
+import json
+import atexit
+import codecs
+import hashlib
+import threading
+import time
 import cloudscraper
+from collections import deque
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from contextvars import copy_context
+from urllib.parse import urlparse, urlsplit, urlunsplit
 from curl_cffi import requests
+from utils.metrics import METRICS, _percentile
 
-def fetch_html(url):
-    # Session Headers - fake browser info
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                      "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Accept-Language": "en-US,en;q=0.9",
-    }
+# Max number of URLs fetched at the same time by fetch_many
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "8"))
+# Jobs fetch_many may read ahead while their hosts are busy, looking for one on an idle host
+FETCH_LOOKAHEAD = int(os.getenv("FETCH_LOOKAHEAD", "256"))
 
-    try:
-        # Try curl_cffi first
-        response = requests.get(
-            url, 
-            timeout=10, 
-            impersonate="chrome120", # Could replace with safari/firefox if bugging
-            headers=headers
-        )
-    
-        if response.status_code == 200 and "Just a moment" not in response.text:
-            return response.text, "curl_cffi", response.status_code
-        
-    except Exception:
-        pass
+# Default politeness for every host: concurrent requests, seconds between
+# request starts, and token bucket refill rate (requests/sec) + burst size
+HOST_CONCURRENCY = int(os.getenv("HOST_CONCURRENCY", "2"))
+HOST_MIN_DELAY = float(os.getenv("HOST_MIN_DELAY", "0.5"))
+HOST_RATE = float(os.getenv("HOST_RATE", "1.0"))
+HOST_BURST = int(os.getenv("HOST_BURST", "2"))
+# Pooled curl_cffi sessions: seconds one may sit unused before it is closed, and how many are kept at most
+HOST_SESSION_IDLE_TTL = float(os.getenv("HOST_SESSION_IDLE_TTL", "900"))
+MAX_HOST_SESSIONS = int(os.getenv("MAX_HOST_SESSIONS", "64"))
+
+# Seconds a pooled cloudscraper session may sit unused before it is dropped
+SCRAPER_IDLE_TTL = float(os.getenv("SCRAPER_IDLE_TTL", "900"))
+
+# Send If-None-Match/If-Modified-Since and report unchanged pages as NOT_MODIFIED
+CONDITIONAL_FETCH = os.getenv("CONDITIONAL_FETCH", "1") == "1"
+VALIDATOR_CACHE_PATH = os.path.join('data', 'cache', 'validators.json')
+NOT_MODIFIED = 304
+
+# Streaming reads (fetch_html with a sink): bytes read per page before the
+# rest is dropped, chunk size, and how much is held back to spot a challenge page
+MAX_PAGE_BYTES = int(os.getenv("MAX_PAGE_BYTES", str(8 * 1024 * 1024)))
+STREAM_CHUNK_SIZE = 64 * 1024
+CHALLENGE_PEEK = 16 * 1024
+
+# Per-host backend/profile/latency memory used to route fetches
+STRATEGY_CACHE_PATH = os.path.join('data', 'cache', 'strategies.json')
+IMPERSONATE_PROFILES = ["chrome120", "safari17_0", "firefox133", "edge101"]
+CURL_TIMEOUT = 10
+CLOUDSCRAPER_TIMEOUT = 30
+MIN_TIMEOUT = 3
+CURL_FAILURES_BEFORE_SKIP = 2 # Consecutive curl_cffi failures before going straight to cloudscraper
+CURL_PROBE_EVERY = 10 # Still retry curl_cffi on every Nth fetch of a skipped host
+LATENCY_SAMPLES = 20
+
+# Per-host overrides, e.g. {"news.abbvie.com": {"concurrency": 1, "min_delay": 2.0}}
+HOST_POLICIES = {}
+
+# Session Headers - fake browser info
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
 
+def normalize_url(url):
+    """
+    Canonical form of a fetch target: trimmed, scheme and host lowercased,
+    default port and #fragment dropped, empty path as "/". URLs that
+    normalize the same are the same page.
+    """
+    url = url.strip()
     try:
-        # Fallback: use cloudscraper if bot-detected or failed
-        scraper = cloudscraper.create_scraper(
-            browser={
-                "browser": "chrome", 
-                "platform": "windows", 
-                "mobile": False
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    if not parts.scheme or not parts.hostname:
+        return url
+
+    scheme = parts.scheme.lower()
+    netloc = f"[{parts.hostname}]" if ":" in parts.hostname else parts.hostname
+    if parts.username or parts.password:
+        netloc = parts.netloc.rpartition("@")[0] + "@" + netloc
+    if port and port != DEFAULT_PORTS.get(scheme):
+        netloc += f":{port}"
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+# --- Per-host scheduling ---
+class _HostState:
+    def __init__(self, concurrency, min_delay, rate, burst):
+        self.concurrency = concurrency
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.lock = threading.Lock()
+        self.min_delay = min_delay
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.refilled = time.monotonic()
+        self.last_start = 0.0
+        self.session = None
+        self.last_used = 0.0
+        self.active = 0 # Slots held, i.e. requests that may be using session
+
+class HostScheduler:
+    """
+    Limits how hard a sweep hits any single host: a concurrency cap, a minimum
+    delay between request starts and a token bucket rate limit per hostname.
+    Also keeps one persistent curl_cffi session per host so connections and
+    TLS handshakes are reused across URLs on that host. Sessions of hosts
+    with no request in flight are closed once unused for longer than
+    idle_ttl seconds, or least recently used first beyond max_sessions.
+    """
+    def __init__(self, policies=None, idle_ttl=None, max_sessions=None):
+        self.policies = HOST_POLICIES if policies is None else policies
+        self.idle_ttl = HOST_SESSION_IDLE_TTL if idle_ttl is None else idle_ttl
+        self.max_sessions = MAX_HOST_SESSIONS if max_sessions is None else max_sessions
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _state(self, host):
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                policy = self.policies.get(host, {})
+                state = _HostState(
+                    policy.get("concurrency", HOST_CONCURRENCY),
+                    policy.get("min_delay", HOST_MIN_DELAY),
+                    policy.get("rate", HOST_RATE),
+                    policy.get("burst", HOST_BURST),
+                )
+                self._hosts[host] = state
+            return state
+
+    def throttle(self, host):
+        """Blocks until host may receive another request (token bucket + min delay)."""
+        state = self._state(host)
+        while True:
+            with state.lock:
+                now = time.monotonic()
+                if state.rate > 0:
+                    state.tokens = min(state.burst, state.tokens + (now - state.refilled) * state.rate)
+                    state.refilled = now
+                    token_wait = 0.0 if state.tokens >= 1 else (1 - state.tokens) / state.rate
+                else:
+                    token_wait = 0.0
+                delay_wait = max(0.0, state.last_start + state.min_delay - now)
+                wait_for = max(token_wait, delay_wait)
+                if wait_for <= 0:
+                    if state.rate > 0:
+                        state.tokens -= 1
+                    state.last_start = now
+                    return
+            time.sleep(wait_for)
+
+    def concurrency(self, host):
+        """Requests host may have in flight at once."""
+        return max(1, self._state(host).concurrency)
+
+    @contextmanager
+    def slot(self, url):
+        """Holds one of the host's concurrency slots; yields the host name."""
+        host = urlparse(url).hostname or ""
+        state = self._state(host)
+        state.slots.acquire()
+        with state.lock:
+            state.active += 1
+        try:
+            yield host
+        finally:
+            with state.lock:
+                state.active -= 1
+                state.last_used = time.monotonic()
+            state.slots.release()
+
+    def session(self, host):
+        """Returns the persistent curl_cffi session for host (call while holding one of its slots)."""
+        state = self._state(host)
+        with state.lock:
+            state.last_used = time.monotonic()
+            if state.session is not None:
+                return state.session
+            state.session = requests.Session(headers=HEADERS)
+            session = state.session
+        self._evict_sessions(state.last_used)
+        return session
+
+    def _evict_sessions(self, now):
+        with self._lock:
+            states = list(self._hosts.values())
+        idle = []
+        for state in states:
+            with state.lock:
+                if state.session is not None and not state.active:
+                    idle.append((state.last_used, id(state), state))
+        surplus = sum(1 for state in states if state.session is not None) - self.max_sessions
+        for last_used, _, state in sorted(idle):
+            if now - last_used <= self.idle_ttl and surplus <= 0:
+                break
+            with state.lock:
+                if state.session is None or state.active: # Picked up again meanwhile
+                    continue
+                session, state.session = state.session, None
+            session.close()
+            surplus -= 1
+
+    def close(self):
+        """Closes every pooled session."""
+        with self._lock:
+            for state in self._hosts.values():
+                if state.session is not None:
+                    state.session.close()
+                    state.session = None
+
+SCHEDULER = HostScheduler()
+atexit.register(SCHEDULER.close)
+
+# --- Cloudscraper pooling ---
+class ScraperPool:
+    """
+    Caches one cloudscraper session per host so a Cloudflare clearance solved
+    once keeps serving later URLs on that host. Sessions unused for longer
+    than idle_ttl seconds are closed and evicted on the next lookup.
+    """
+    def __init__(self, idle_ttl=None):
+        self.idle_ttl = SCRAPER_IDLE_TTL if idle_ttl is None else idle_ttl
+        self._scrapers = {}
+        self._lock = threading.Lock()
+
+    def get(self, host):
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._scrapers.get(host)
+            if entry is None:
+                scraper = cloudscraper.create_scraper(
+                    browser={
+                        "browser": "chrome",
+                        "platform": "windows",
+                        "mobile": False
+                    }
+                )
+                entry = self._scrapers[host] = [scraper, now]
+            entry[1] = now
+            return entry[0]
+
+    def discard(self, host):
+        """Drops host's session, e.g. after its clearance stopped working."""
+        with self._lock:
+            entry = self._scrapers.pop(host, None)
+        if entry:
+            entry[0].close()
+
+    def _evict_idle(self, now):
+        for host, (scraper, last_used) in list(self._scrapers.items()):
+            if now - last_used > self.idle_ttl:
+                del self._scrapers[host]
+                scraper.close()
+
+    def close(self):
+        with self._lock:
+            for scraper, _ in self._scrapers.values():
+                scraper.close()
+            self._scrapers.clear()
+
+SCRAPERS = ScraperPool()
+atexit.register(SCRAPERS.close)
+
+# --- Persistent fetch state ---
+class _JsonCache:
+    """A dict persisted as a JSON file, loaded lazily and written on save()."""
+    def __init__(self, path):
+        self.path = path
+        self._entries = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+# --- Conditional fetching ---
+class ValidatorCache(_JsonCache):
+    """
+    On-disk cache of ETag / Last-Modified / body hash per URL, used to send
+    conditional requests and to recognise pages that did not change.
+    """
+    def __init__(self, path=VALIDATOR_CACHE_PATH):
+        super().__init__(path)
+
+    def headers(self, url):
+        """Conditional request headers for url (empty if never seen)."""
+        with self._lock:
+            entry = self._load().get(normalize_url(url), {})
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def unchanged(self, url, response, body_hash=None):
+        """Records response's validators; True if the body matches the last one seen."""
+        if body_hash is None:
+            body_hash = hashlib.sha1(response.content).hexdigest()
+        url = normalize_url(url)
+        with self._lock:
+            entries = self._load()
+            previous = entries.get(url, {})
+            entries[url] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "hash": body_hash,
             }
-        )
-
-        response = scraper.get(
-            url, 
-            timeout=30
-        )
-
-        if response.status_code == 200:
-            return response.text, "cloudscraper", response.status_code
-        else:
-            return None, "cloudscraper", response.status_code
-        
-    except Exception as e:
-        return None, f"Failed to fetch via cloudscraper: {e}", None
+            self._dirty = True
+        return previous.get("hash") == body_hash
+
+    def forget(self, url):
+        """Drops url's validators so the next fetch is unconditional."""
+        with self._lock:
+            if self._load().pop(normalize_url(url), None) is not None:
+                self._dirty = True
+
+VALIDATORS = ValidatorCache()
+
+# --- Adaptive routing ---
+class StrategyMemory(_JsonCache):
+    """
+    Remembers per host which backend and impersonation profile last worked and
+    how long requests took, persisted across runs. route() uses it to skip
+    curl_cffi on hosts that always need cloudscraper and to size timeouts
+    from the observed p95 latency. Counts route_hits/route_misses (whether
+    the first backend tried for a URL was the one that served it) and
+    curl_skips in METRICS.
+    """
+    def __init__(self, path=STRATEGY_CACHE_PATH):
+        super().__init__(path)
+
+    def _entry(self, host):
+        return self._load().setdefault(host, {
+            "backend": None,
+            "profile": IMPERSONATE_PROFILES[0],
+            "curl_failures": 0,
+            "fetches": 0,
+            "latency": {"curl_cffi": [], "cloudscraper": []},
+        })
+
+    def _timeout(self, samples, default):
+        if len(samples) < 5:
+            return default
+        return min(default, max(MIN_TIMEOUT, _percentile(samples, 95) * 3))
+
+    def route(self, host):
+        """Returns (skip_curl, profile, curl_timeout, cloudscraper_timeout) for host."""
+        with self._lock:
+            entry = self._entry(host)
+            entry["fetches"] += 1
+            self._dirty = True
+            skip_curl = (
+                entry["backend"] == "cloudscraper"
+                and entry["curl_failures"] >= CURL_FAILURES_BEFORE_SKIP
+                and entry["fetches"] % CURL_PROBE_EVERY != 0
+            )
+            if skip_curl:
+                METRICS.count("curl_skips")
+            return (
+                skip_curl,
+                entry["profile"],
+                self._timeout(entry["latency"]["curl_cffi"], CURL_TIMEOUT),
+                self._timeout(entry["latency"]["cloudscraper"], CLOUDSCRAPER_TIMEOUT),
+            )
+
+    def record(self, host, backend, latency, first_try):
+        """Records a successful fetch of host via backend."""
+        with self._lock:
+            entry = self._entry(host)
+            entry["backend"] = backend
+            if backend == "curl_cffi":
+                entry["curl_failures"] = 0
+            samples = entry["latency"][backend]
+            samples.append(round(latency, 3))
+            del samples[:-LATENCY_SAMPLES]
+            self._dirty = True
+        METRICS.count("route_hits" if first_try else "route_misses")
+
+    def record_curl_failure(self, host, blocked):
+        """Counts a curl_cffi failure; a block also rotates host to the next impersonation profile."""
+        with self._lock:
+            entry = self._entry(host)
+            entry["curl_failures"] += 1
+            self._dirty = True
+            if not blocked:
+                return
+            index = IMPERSONATE_PROFILES.index(entry["profile"]) if entry["profile"] in IMPERSONATE_PROFILES else -1
+            entry["profile"] = IMPERSONATE_PROFILES[(index + 1) % len(IMPERSONATE_PROFILES)]
+
+STRATEGIES = StrategyMemory()
+
+def save_fetch_state():
+    """Persists the validator cache and routing memory; call once per sweep."""
+    VALIDATORS.save()
+    STRATEGIES.save()
+
+# --- Fetching ---
+def _read_body(response, sink=None, max_bytes=None, detect_challenge=True):
+    """
+    Returns (body, body_hash, challenged). Without a sink, body is the page text
+    and body_hash None. With one, the body is decoded and fed to sink()
+    chunk by chunk, stopping after max_bytes (MAX_PAGE_BYTES), and body is the
+    sink's close() result. A "Just a moment" page returns (None, None, True).
+    """
+    if sink is None:
+        text = response.text
+        METRICS.count("fetch_bytes", len(response.content))
+        if detect_challenge and "Just a moment" in text:
+            METRICS.count("fetch_challenges")
+            return None, None, True
+        return text, None, False
+
+    max_bytes = max_bytes or MAX_PAGE_BYTES
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+    body_hash = hashlib.sha1()
+    consumer = None
+    head = "" # Held back until it is clearly not a challenge page
+    read = 0
+    try:
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            chunk = chunk[:max_bytes - read]
+            read += len(chunk)
+            body_hash.update(chunk)
+            text = decoder.decode(chunk, final=read >= max_bytes)
+            if consumer is None:
+                head += text
+                if detect_challenge and "Just a moment" in head:
+                    METRICS.count("fetch_challenges")
+                    return None, None, True
+                if len(head) < CHALLENGE_PEEK and read < max_bytes:
+                    continue
+                consumer, text, head = sink(), head, ""
+            consumer.feed(text)
+            if read >= max_bytes:
+                break
+    finally:
+        response.close()
+        METRICS.count("fetch_bytes", read)
+
+    if consumer is None:
+        consumer = sink()
+        consumer.feed(head)
+    consumer.feed(decoder.decode(b"", final=True))
+    return consumer.close(), body_hash.hexdigest(), False
+
+def fetch_html(url, conditional=None, sink=None, max_bytes=None):
+    """
+    Returns (html, source, status_code). With conditional fetching on, a 304
+    or a body identical to the last fetch returns (None, source, NOT_MODIFIED).
+    With a sink (e.g. scraper.StreamExtractor), the body is streamed into
+    sink(url) instead of being read whole, and html is the sink's close() result.
+    Timed as the "fetch" stage, and as "fetch.<source>" for the strategy that
+    answered (so fetch.cloudscraper includes any failed curl_cffi attempt).
+    """
+    started = time.perf_counter()
+    html, source, status_code = _fetch_html(url, conditional, sink, max_bytes)
+    elapsed = time.perf_counter() - started
+
+    METRICS.observe("fetch", elapsed)
+    METRICS.observe("fetch." + (source if source in ("curl_cffi", "cloudscraper") else "failed"), elapsed)
+    METRICS.count("fetches")
+    if status_code == NOT_MODIFIED:
+        METRICS.count("fetch_not_modified")
+    elif html is None:
+        METRICS.count("fetch_errors")
+    return html, source, status_code
+
+def _fetch_html(url, conditional, sink, max_bytes):
+    if conditional is None:
+        conditional = CONDITIONAL_FETCH
+    extra_headers = VALIDATORS.headers(url) if conditional else {}
+    if sink is not None:
+        sink = partial(sink, url)
+
+    with SCHEDULER.slot(url) as host:
+        skip_curl, profile, curl_timeout, cloudscraper_timeout = STRATEGIES.route(host)
+
+        if not skip_curl:
+            blocked = False
+            try:
+                # Try curl_cffi first, with the last profile that worked for this host
+                SCHEDULER.throttle(host)
+                METRICS.count("curl_cffi_requests")
+                started = time.monotonic()
+                response = SCHEDULER.session(host).get(
+                    url,
+                    timeout=curl_timeout,
+                    impersonate=profile,
+                    headers=extra_headers,
+                    stream=sink is not None,
+                )
+
+                if response.status_code == NOT_MODIFIED and extra_headers:
+                    STRATEGIES.record(host, "curl_cffi", time.monotonic() - started, True)
+                    return None, "curl_cffi", NOT_MODIFIED
+
+                if response.status_code == 200:
+                    body, body_hash, blocked = _read_body(response, sink, max_bytes)
+                    if not blocked:
+                        STRATEGIES.record(host, "curl_cffi", time.monotonic() - started, True)
+                        if conditional and VALIDATORS.unchanged(url, response, body_hash):
+                            return None, "curl_cffi", NOT_MODIFIED
+                        return body, "curl_cffi", response.status_code
+                else:
+                    blocked = response.status_code in (403, 503) or (sink is None and "Just a moment" in response.text)
+                    if sink is not None:
+                        response.close()
+            except Exception:
+                pass
+            STRATEGIES.record_curl_failure(host, blocked)
+
+        try:
+            # Fallback: use the host's pooled cloudscraper if bot-detected or failed
+            scraper = SCRAPERS.get(host)
+
+            SCHEDULER.throttle(host)
+            METRICS.count("cloudscraper_requests")
+            if not skip_curl:
+                METRICS.count("fetch_fallbacks")
+            started = time.monotonic()
+            response = scraper.get(
+                url,
+                timeout=cloudscraper_timeout,
+                headers=extra_headers,
+                stream=sink is not None,
+            )
+
+            if response.status_code == NOT_MODIFIED and extra_headers:
+                STRATEGIES.record(host, "cloudscraper", time.monotonic() - started, skip_curl)
+                return None, "cloudscraper", NOT_MODIFIED
+
+            if response.status_code == 200:
+                body, body_hash, _ = _read_body(response, sink, max_bytes, detect_challenge=False)
+                STRATEGIES.record(host, "cloudscraper", time.monotonic() - started, skip_curl)
+                if conditional and VALIDATORS.unchanged(url, response, body_hash):
+                    return None, "cloudscraper", NOT_MODIFIED
+                return body, "cloudscraper", response.status_code
+            else:
+                if sink is not None:
+                    response.close()
+                if response.status_code in (403, 503):
+                    SCRAPERS.discard(host) # Clearance rejected - solve fresh next time
+                return None, "cloudscraper", response.status_code
+
+        except Exception as e:
+            SCRAPERS.discard(host)
+            return None, f"Failed to fetch via cloudscraper: {e}", None
+
+def fetch_many(jobs, max_workers=None, sink=None, lookahead=None):
+    """
+    Fetches (tag, url) jobs concurrently and yields (tag, html, source, status_code)
+    as each one completes. At most max_workers requests are in flight at once and
+    jobs is consumed lazily, so generators of rows are never materialized.
+    sink is passed on to fetch_html.
+
+    Dispatch is host-aware: a job whose host already has as many requests in
+    flight as its concurrency allows is set aside (up to lookahead of them)
+    while later jobs for other hosts start, so a company's consecutive rows
+    do not park every worker on one host's slots. Set-aside jobs start first,
+    in order, as their host frees up.
+    """
+    max_workers = max_workers or FETCH_CONCURRENCY
+    lookahead = lookahead or FETCH_LOOKAHEAD
+    jobs = iter(jobs)
+    pending = {}
+    in_flight = {}
+    deferred = {} # host -> deque of (tag, url), oldest host first
+    deferred_count = 0
+    exhausted = False
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        def start(tag, url, host):
+            in_flight[host] = in_flight.get(host, 0) + 1
+            # In the caller's context, so the fetch is recorded in its sweep's report
+            pending[pool.submit(copy_context().run, fetch_html, url, sink=sink)] = (tag, host)
+
+        def has_slot(host):
+            return in_flight.get(host, 0) < SCHEDULER.concurrency(host)
+
+        def fill():
+            nonlocal deferred_count, exhausted
+            for host in list(deferred):
+                queue = deferred[host]
+                while queue and len(pending) < max_workers and has_slot(host):
+                    start(*queue.popleft(), host)
+                    deferred_count -= 1
+                if not queue:
+                    del deferred[host]
+            while not exhausted and len(pending) < max_workers and deferred_count < lookahead:
+                job = next(jobs, None)
+                if job is None:
+                    exhausted = True
+                    break
+                tag, url = job
+                host = urlparse(url).hostname or ""
+                if host in deferred or not has_slot(host):
+                    deferred.setdefault(host, deque()).append((tag, url))
+                    deferred_count += 1
+                else:
+                    start(tag, url, host)
+
+        fill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            finished = []
+            for future in done:
+                tag, host = pending.pop(future)
+                in_flight[host] -= 1
+                try:
+                    html, source, status_code = future.result()
+                except Exception as e:
+                    html, source, status_code = None, f"Failed to fetch: {e}", None
+                finished.append((tag, html, source, status_code))
+            fill()
+            yield from finished
@@ -0,0 +1,337 @@
+# To keep every version of every snapshot as item-level deltas, and query what appeared when
+"""
+Usage: python -m utils.history new-since 2026-10-01 [--company Acme] [--url-type "Press Releases"]
+       python -m utils.history log Acme "Press Releases" [--since 2026-10-01]
+       python -m utils.history compact
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from utils.backends import item_digest
+
+# Days of versions kept one by one; older ones are folded into a base version
+HISTORY_RETENTION_DAYS = float(os.getenv("HISTORY_RETENTION_DAYS", "90"))
+HISTORY_COMPACT_EVERY = float(os.getenv("HISTORY_COMPACT_EVERY", "86400")) # Seconds between automatic compactions
+
+ADDED = 1
+REMOVED = -1
+
+def _item_json(item):
+    return json.dumps(item, separators=(",", ":"))
+
+class SnapshotHistory:
+    """
+    Append-only history of every snapshot key in SQLite. Each save that
+    changes a snapshot appends a version holding only its item-level delta
+    (items added, digests of items removed), so history grows with what
+    changes rather than with snapshot size.
+
+    The items table indexes every item by the time it first appeared
+    (NULL for items already there when history began), which answers
+    "new since X" without replaying versions. compact() folds versions older
+    than the retention window into a single base version per key.
+    """
+    def __init__(self, path, retention_days=HISTORY_RETENTION_DAYS):
+        self.path = path
+        self.retention = retention_days * 86400
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS series (key TEXT PRIMARY KEY, company TEXT NOT NULL, url_type TEXT NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS series_company ON series (company, url_type)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS versions (key TEXT NOT NULL, version INTEGER NOT NULL, recorded_at REAL NOT NULL,"
+                " base INTEGER NOT NULL, added INTEGER NOT NULL, removed INTEGER NOT NULL, PRIMARY KEY (key, version))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS deltas (key TEXT NOT NULL, version INTEGER NOT NULL, op INTEGER NOT NULL,"
+                " digest BLOB NOT NULL, item TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS deltas_version ON deltas (key, version)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS items (key TEXT NOT NULL, digest BLOB NOT NULL, item TEXT NOT NULL,"
+                " first_seen REAL, removed_at REAL, PRIMARY KEY (key, digest))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS items_first_seen ON items (first_seen)")
+            conn.execute("CREATE INDEX IF NOT EXISTS items_key_first_seen ON items (key, first_seen)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+            self._conn = conn
+        return self._conn
+
+    # --- Recording ---
+    @staticmethod
+    def _append(conn, key, version, now, added, removed, base=False, first_seen=None):
+        """Writes one version: added is {digest: item}, removed a list of digests."""
+        conn.execute(
+            "INSERT INTO versions (key, version, recorded_at, base, added, removed) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, version, now, int(base), len(added), len(removed)),
+        )
+        conn.executemany(
+            "INSERT INTO deltas (key, version, op, digest, item) VALUES (?, ?, ?, ?, ?)",
+            [(key, version, ADDED, digest, _item_json(item)) for digest, item in added.items()]
+            + [(key, version, REMOVED, digest, None) for digest in removed],
+        )
+        conn.executemany(
+            "INSERT INTO items (key, digest, item, first_seen, removed_at) VALUES (?, ?, ?, ?, NULL)"
+            " ON CONFLICT (key, digest) DO UPDATE SET first_seen = excluded.first_seen, removed_at = NULL",
+            [(key, digest, _item_json(item), first_seen) for digest, item in added.items()],
+        )
+        conn.executemany(
+            "UPDATE items SET removed_at = ? WHERE key = ? AND digest = ?",
+            [(now, key, digest) for digest in removed],
+        )
+
+    def record(self, key, company, url_type, data, seed=None, legacy=None):
+        """
+        Appends data (a snapshot about to be saved under key) as a new version
+        if it differs from the last one. The first time key is seen, seed()
+        may return the snapshot saved before history existed; it becomes the
+        base, and its items count as already known rather than new. legacy(item)
+        gives the digests an item of data may have had in an older seed; seeded
+        items matching one are replaced by the item in its current form.
+        Returns the number of items added.
+        """
+        now = time.time()
+        current = {}
+        for item in data:
+            current.setdefault(item_digest(item), item)
+
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("INSERT OR IGNORE INTO series (key, company, url_type) VALUES (?, ?, ?)", (key, company, url_type))
+                last = conn.execute("SELECT MAX(version) FROM versions WHERE key = ?", (key,)).fetchone()[0] or 0
+                if not last and seed is not None:
+                    previous = {}
+                    for item in seed() or []:
+                        previous.setdefault(item_digest(item), item)
+                    if previous and legacy is not None:
+                        for digest, item in current.items():
+                            if digest in previous:
+                                continue
+                            for old in legacy(item):
+                                if old in previous:
+                                    del previous[old]
+                                    previous[digest] = item
+                                    break
+                    if previous:
+                        last = 1
+                        self._append(conn, key, last, now, previous, [], base=True)
+
+                present = {row[0] for row in conn.execute("SELECT digest FROM items WHERE key = ? AND removed_at IS NULL", (key,))}
+                added = {digest: item for digest, item in current.items() if digest not in present}
+                removed = [digest for digest in present if digest not in current]
+                if added or removed or not last:
+                    self._append(conn, key, last + 1, now, added, removed, base=not last, first_seen=now)
+        return len(added)
+
+    # --- Queries ---
+    def new_items_since(self, since, company=None, url_type=None, until=None):
+        """
+        Items that first appeared at or after since (a timestamp), optionally
+        for one company and/or URL Type, oldest first:
+            [{"company", "url_type", "item", "first_seen", "removed_at"}]
+        """
+        query = (
+            "SELECT s.company, s.url_type, i.item, i.first_seen, i.removed_at FROM items i"
+            " JOIN series s ON s.key = i.key WHERE i.first_seen >= ?"
+        )
+        params = [since]
+        if until is not None:
+            query += " AND i.first_seen < ?"
+            params.append(until)
+        if company is not None:
+            query += " AND s.company = ?"
+            params.append(company)
+        if url_type is not None:
+            query += " AND s.url_type = ?"
+            params.append(url_type)
+        with self._lock:
+            rows = self._connect().execute(query + " ORDER BY i.first_seen", params).fetchall()
+        return [
+            {"company": c, "url_type": t, "item": json.loads(item), "first_seen": first_seen, "removed_at": removed_at}
+            for c, t, item, first_seen, removed_at in rows
+        ]
+
+    def log(self, key, since=None):
+        """
+        Versions of key (oldest first, from since if given), each with the
+        items it added and removed:
+            [{"version", "recorded_at", "base", "added": [...], "removed": [...]}]
+        Removed items are only listed while their data is retained.
+        """
+        with self._lock:
+            conn = self._connect()
+            versions = conn.execute(
+                "SELECT version, recorded_at, base FROM versions WHERE key = ? AND recorded_at >= ? ORDER BY version",
+                (key, since or 0),
+            ).fetchall()
+            deltas = conn.execute(
+                "SELECT d.version, d.op, COALESCE(d.item, i.item) FROM deltas d"
+                " LEFT JOIN items i ON i.key = d.key AND i.digest = d.digest"
+                " WHERE d.key = ? AND d.version >= ? ORDER BY d.rowid",
+                (key, versions[0][0] if versions else 0),
+            ).fetchall()
+
+        entries = {version: {"version": version, "recorded_at": recorded_at, "base": bool(base), "added": [], "removed": []}
+                   for version, recorded_at, base in versions}
+        for version, op, item in deltas:
+            if version in entries and item is not None:
+                entries[version]["added" if op == ADDED else "removed"].append(json.loads(item))
+        return list(entries.values())
+
+    def change_times(self, key):
+        """When key gained new items (its retained non-base versions that added any), oldest first."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT recorded_at FROM versions WHERE key = ? AND base = 0 AND added > 0 ORDER BY version", (key,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def first_recorded(self, key):
+        """When history for key begins, or None."""
+        with self._lock:
+            row = self._connect().execute("SELECT MIN(recorded_at) FROM versions WHERE key = ?", (key,)).fetchone()
+        return row[0]
+
+    def snapshot_at(self, key, when):
+        """The items key held at time when (replayed from its base), or None if history starts later."""
+        with self._lock:
+            conn = self._connect()
+            version = conn.execute(
+                "SELECT MAX(version) FROM versions WHERE key = ? AND recorded_at <= ?", (key, when)
+            ).fetchone()[0]
+            if version is None:
+                return None
+            deltas = conn.execute(
+                "SELECT op, digest, item FROM deltas WHERE key = ? AND version <= ? ORDER BY version, rowid", (key, version)
+            ).fetchall()
+        state = {}
+        for op, digest, item in deltas:
+            if op == ADDED:
+                state[digest] = item
+            else:
+                state.pop(digest, None)
+        return [json.loads(item) for item in state.values()]
+
+    # --- Retention ---
+    def compact(self, now=None):
+        """
+        Folds every key's versions older than the retention window into one
+        base version (the state at the newest of them) and forgets items
+        removed before the window. Returns the number of versions folded away.
+        """
+        now = time.time() if now is None else now
+        cutoff = now - self.retention
+        folded = 0
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                stale = conn.execute(
+                    "SELECT key, MAX(version), COUNT(*), MIN(base) FROM versions WHERE recorded_at < ? GROUP BY key", (cutoff,)
+                ).fetchall()
+                for key, fold_to, count, all_base in stale:
+                    if count == 1 and all_base:
+                        continue # Already a single base
+                    state = {}
+                    for op, digest, item in conn.execute(
+                        "SELECT op, digest, item FROM deltas WHERE key = ? AND version <= ? ORDER BY version, rowid", (key, fold_to)
+                    ):
+                        if op == ADDED:
+                            state[digest] = item
+                        else:
+                            state.pop(digest, None)
+                    recorded_at = conn.execute(
+                        "SELECT recorded_at FROM versions WHERE key = ? AND version = ?", (key, fold_to)
+                    ).fetchone()[0]
+                    conn.execute("DELETE FROM deltas WHERE key = ? AND version <= ?", (key, fold_to))
+                    conn.execute("DELETE FROM versions WHERE key = ? AND version <= ?", (key, fold_to))
+                    conn.execute(
+                        "INSERT INTO versions (key, version, recorded_at, base, added, removed) VALUES (?, ?, ?, 1, ?, 0)",
+                        (key, fold_to, recorded_at, len(state)),
+                    )
+                    conn.executemany(
+                        "INSERT INTO deltas (key, version, op, digest, item) VALUES (?, ?, ?, ?, ?)",
+                        [(key, fold_to, ADDED, digest, item) for digest, item in state.items()],
+                    )
+                    folded += count - 1
+                conn.execute("DELETE FROM items WHERE removed_at < ?", (cutoff,))
+                conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('compacted_at', ?)", (str(now),))
+        return folded
+
+    def compact_if_due(self, every=HISTORY_COMPACT_EVERY):
+        """Runs compact() if the last one was more than every seconds ago."""
+        with self._lock:
+            row = self._connect().execute("SELECT value FROM meta WHERE name = 'compacted_at'").fetchone()
+        if row is None or time.time() - float(row[0]) >= every:
+            return self.compact()
+        return 0
+
+# --- CLI ---
+def _timestamp(text):
+    """A date or ISO datetime (local time) as a timestamp."""
+    return datetime.fromisoformat(text).timestamp()
+
+def _format_time(timestamp):
+    return "before history" if timestamp is None else datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query and maintain the snapshot history.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    new_since = commands.add_parser("new-since", help="items that first appeared on or after a date")
+    new_since.add_argument("since", help="date or datetime, e.g. 2026-10-01")
+    new_since.add_argument("--company")
+    new_since.add_argument("--url-type")
+    log = commands.add_parser("log", help="versions of one page with the items each added and removed")
+    log.add_argument("company")
+    log.add_argument("url_type")
+    log.add_argument("--since", help="date or datetime")
+    commands.add_parser("compact", help="fold versions older than HISTORY_RETENTION_DAYS into a base")
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    args = parser.parse_args(argv)
+
+    from utils.storage import HISTORY, get_snapshot_key
+    if HISTORY is None:
+        print("❌ Snapshot history is turned off (SNAPSHOT_HISTORY=0).", file=sys.stderr)
+        return 2
+
+    try:
+        if args.command == "new-since":
+            results = HISTORY.new_items_since(_timestamp(args.since), args.company, args.url_type)
+            if args.json:
+                print(json.dumps(results, ensure_ascii=False, indent=1))
+            for entry in [] if args.json else results:
+                item = entry["item"]
+                print(f"{_format_time(entry['first_seen'])}  {entry['company']} ({entry['url_type']}): {item['title']} ({item['timestamp']})")
+                print(f"    Link: {item['link']}")
+        elif args.command == "log":
+            since = _timestamp(args.since) if args.since else None
+            entries = HISTORY.log(get_snapshot_key(args.company, args.url_type), since)
+            if args.json:
+                print(json.dumps(entries, ensure_ascii=False, indent=1))
+            for entry in [] if args.json else entries:
+                kind = "base" if entry["base"] else f"+{len(entry['added'])} -{len(entry['removed'])}"
+                print(f"v{entry['version']}  {_format_time(entry['recorded_at'])}  {kind}")
+                for item in [] if entry["base"] else entry["added"]:
+                    print(f"    + {item['title']} ({item['timestamp']})")
+                for item in entry["removed"]:
+                    print(f"    - {item['title']} ({item['timestamp']})")
+        else:
+            print(f"✅ Folded {HISTORY.compact()} old version(s).")
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
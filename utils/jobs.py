@@ -0,0 +1,147 @@
+# To run sweeps as background jobs that can be polled, streamed and cancelled
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from utils.journal import SweepJournal
+from utils.metrics import SweepReport
+from utils.sweep import CHANGED, ERROR, UNCHANGED, run_sweep
+
+# Sweeps run at the same time (others wait in the queue), and how many may wait
+SWEEP_JOB_WORKERS = int(os.getenv("SWEEP_JOB_WORKERS", "1"))
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "10"))
+# Seconds a finished job's results are kept for polling
+JOB_TTL = float(os.getenv("JOB_TTL", "3600"))
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+FAILED = "failed"
+FINISHED_STATES = (DONE, CANCELLED, FAILED)
+
+class QueueFull(Exception):
+    pass
+
+class SweepJob:
+    """One background sweep. results grows as rows finish; read it through snapshot()."""
+    def __init__(self, rows, label=None, total=None):
+        self.id = uuid.uuid4().hex
+        self.label = label
+        self.rows = rows
+        self.total = total
+        self.state = QUEUED
+        self.error = None
+        self.results = []
+        self.counts = {CHANGED: 0, UNCHANGED: 0, ERROR: 0}
+        self.created_at = time.time()
+        self.started_at = self.finished_at = None
+        self.report = SweepReport()
+        self.cancel_event = threading.Event()
+        self.changed = threading.Condition()
+
+    def run(self):
+        if self.cancel_event.is_set():
+            self._finish(CANCELLED)
+            return
+        self._update(state=RUNNING, started_at=time.time())
+
+        journal = SweepJournal(self.label) if self.label else None # Resumes a sheet's interrupted sweep
+        sweep = run_sweep(self.rows, journal=journal, report=self.report)
+        try:
+            for result in sweep:
+                with self.changed:
+                    self.results.append(result)
+                    self.counts[result["status"]] += 1
+                    self.changed.notify_all()
+                if self.cancel_event.is_set():
+                    break
+        except Exception as e:
+            self._finish(FAILED, error=str(e))
+            return
+        finally:
+            sweep.close() # Saves fetch state and pushes what was swept so far
+        self._finish(CANCELLED if self.cancel_event.is_set() else DONE)
+
+    def _update(self, **fields):
+        with self.changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.changed.notify_all()
+
+    def _finish(self, state, **fields):
+        self.rows = None
+        self._update(state=state, finished_at=time.time(), **fields)
+
+    def cancel(self):
+        """Stops the sweep after the row in progress (or before it starts)."""
+        self.cancel_event.set()
+
+    def snapshot(self, since=0):
+        """JSON-ready status, with the results from index since onwards."""
+        with self.changed:
+            return {
+                "id": self.id,
+                "label": self.label,
+                "state": self.state,
+                "error": self.error,
+                "processed": len(self.results),
+                "total": self.total,
+                "counts": dict(self.counts),
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "since": since,
+                "results": self.results[since:],
+            }
+
+    def wait(self, since, timeout=None):
+        """Blocks until there are results past since or the job finishes. Returns snapshot(since)."""
+        with self.changed:
+            self.changed.wait_for(lambda: len(self.results) > since or self.state in FINISHED_STATES, timeout)
+        return self.snapshot(since)
+
+class JobManager:
+    """
+    Runs SweepJobs on a bounded thread pool. Jobs beyond the pool wait in
+    its queue, up to max_queued; finished jobs are forgotten after ttl.
+    """
+    def __init__(self, workers=SWEEP_JOB_WORKERS, max_queued=MAX_QUEUED_JOBS, ttl=JOB_TTL):
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sweep-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+    def submit(self, rows, label=None, total=None):
+        """Queues a sweep over rows and returns its SweepJob. Raises QueueFull when too many are waiting."""
+        with self._lock:
+            self._prune()
+            waiting = sum(1 for job in self._jobs.values() if job.state == QUEUED)
+            if waiting >= self.max_queued:
+                raise QueueFull(f"{waiting} sweeps are already waiting")
+            job = SweepJob(rows, label, total)
+            self._jobs[job.id] = job
+        self._pool.submit(job.run)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Asks job_id to stop after its current row. Returns the job, or None if unknown."""
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+JOBS = JobManager()
@@ -0,0 +1,123 @@
+# To resume a sweep that died partway: an append-only journal of finished rows
+import os
+import json
+import re
+import threading
+import time
+from utils.fetcher import normalize_url
+
+JOURNAL_DIR = os.path.join('data', 'cache', 'sweeps')
+# Seconds a finished row stays valid for resuming an interrupted sweep
+SWEEP_RESUME_WINDOW = float(os.getenv("SWEEP_RESUME_WINDOW", "21600"))
+
+def row_key(row):
+    return f"{row['company']}|{row['url type']}|{normalize_url(row['url'])}"
+
+class SweepJournal:
+    """
+    JSON-lines checkpoint of one named sweep (e.g. per config sheet). Every
+    finished row is appended and fsynced with its result (and, if it changed,
+    the snapshot it saved), so a sweep that dies partway can report those
+    rows again and re-stage their snapshots for the push that never ran.
+
+    complete() marks a sweep that ran to the end; its rows are not resumed
+    again, but their snapshots stay pending (re-staged by every later run)
+    until finish() clears the journal once a push succeeds.
+    """
+    def __init__(self, name, directory=JOURNAL_DIR, window=SWEEP_RESUME_WINDOW):
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", name or "sweep")
+        self.path = os.path.join(directory, f"{safe_name}.jsonl")
+        self.window = window
+        self.pending = {}
+        self._file = None
+        self._inode = None
+        self._lock = threading.Lock()
+
+    def _read(self):
+        entries = []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        break # A torn last line from the crash
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def open(self):
+        """
+        Starts (or resumes) the sweep. Returns {row_key: (result, items)} for
+        rows an unfinished earlier run completed within the window; empty for
+        a fresh start. Sets pending to {row_key: (result, items)}, the
+        snapshots of completed runs that were never pushed.
+        """
+        rows, pending = {}, {}
+        for entry in self._read():
+            event = entry.get("event")
+            if event == "row":
+                rows[entry["key"]] = entry
+            elif event == "pending":
+                pending[entry["key"]] = entry
+            elif event == "complete": # That run's rows only wait for the push now
+                pending.update(rows)
+                rows = {}
+        cutoff = time.time() - self.window
+        kept = [entry for entry in rows.values() if entry["at"] >= cutoff]
+
+        # Rewrite rather than append, dropping stale rows and any torn line
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"event": "resume" if kept else "start", "at": time.time()}) + "\n")
+            for entry in pending.values():
+                f.write(json.dumps(dict(entry, event="pending"), ensure_ascii=False) + "\n")
+            for entry in kept:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(temp_path, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        self.pending = {key: (entry["result"], entry["items"]) for key, entry in pending.items()}
+        return {entry["key"]: (entry["result"], entry.get("items")) for entry in kept}
+
+    def _append(self, entry):
+        with self._lock:
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def record(self, row, result, items=None):
+        """Checkpoints a finished row; items is the snapshot it saved, if worth keeping."""
+        self._append({"event": "row", "at": time.time(), "key": row_key(row), "result": result, "items": items})
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def complete(self):
+        """The sweep ran to the end: a rerun refetches every row and only re-stages what is still unpushed."""
+        self._append({"event": "complete", "at": time.time()})
+        self.close()
+
+    def reset(self):
+        """Discards the checkpoint (e.g. to start over), whoever wrote it."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def finish(self):
+        """
+        The sweep completed and was pushed - nothing left to resume or stage.
+        Safe to call from a push thread: a journal reopened since is kept.
+        """
+        self.close()
+        try:
+            if os.stat(self.path).st_ino == self._inode:
+                os.remove(self.path)
+        except FileNotFoundError:
+            pass
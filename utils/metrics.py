@@ -0,0 +1,233 @@
+# To time and count each sweep stage, for per-sweep reports and a Prometheus endpoint
+import os
+import json
+import resource
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Trace Python allocations during each sweep for its report's peak memory (slows the sweep)
+SWEEP_TRACEMALLOC = os.getenv("SWEEP_TRACEMALLOC", "0") == "1"
+REPORT_DIR = os.path.join('data', 'cache', 'reports')
+SWEEP_REPORTS_KEPT = int(os.getenv("SWEEP_REPORTS_KEPT", "50")) # Newest per-sweep reports kept on disk
+QUANTILE_WINDOW = 1024 # Recent samples per stage behind the exported quantiles
+
+# Recorders open in the current context (thread, or a task run with its context copied)
+_RECORDERS = ContextVar("metrics_recorders", default=())
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+class Recorder:
+    """
+    Counters plus per-stage timings ([calls, total seconds, max seconds,
+    samples]). Keeps every sample, or only the newest window of them.
+    """
+    def __init__(self, window=None):
+        self.window = window
+        self.counters = {}
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            timing = self.timings.setdefault(stage, [0, 0.0, 0.0, []])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+            timing[3].append(seconds)
+            if self.window and len(timing[3]) > 2 * self.window:
+                del timing[3][:-self.window]
+
+    def export(self):
+        """A picklable copy, for merge()."""
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "timings": {stage: [c, t, m, list(s)] for stage, (c, t, m, s) in self.timings.items()},
+            }
+
+    def merge(self, exported):
+        with self._lock:
+            for name, value in exported["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for stage, (calls, total, longest, samples) in exported["timings"].items():
+                timing = self.timings.setdefault(stage, [0, 0.0, 0.0, []])
+                timing[0] += calls
+                timing[1] += total
+                timing[2] = max(timing[2], longest)
+                timing[3].extend(samples)
+                if self.window and len(timing[3]) > 2 * self.window:
+                    del timing[3][:-self.window]
+
+    def stages(self):
+        """{stage: {"calls", "total_s", "p50_ms", "p95_ms", "max_ms"}}"""
+        with self._lock:
+            timings = {stage: (c, t, m, list(s[-self.window:] if self.window else s)) for stage, (c, t, m, s) in self.timings.items()}
+        return {
+            stage: {
+                "calls": calls,
+                "total_s": round(total, 3),
+                "p50_ms": round(_percentile(samples, 50) * 1000, 2),
+                "p95_ms": round(_percentile(samples, 95) * 1000, 2),
+                "max_ms": round(longest * 1000, 2),
+            }
+            for stage, (calls, total, longest, samples) in sorted(timings.items())
+        }
+
+class Metrics:
+    """
+    Process-wide counters and stage timings. Everything recorded goes into
+    the running totals (exported by prometheus()) and into the recorders
+    opened with recording() in the recording context, e.g. the report of
+    the sweep running on this thread, so overlapping sweeps stay apart.
+    Threads a sweep starts see its recorders only if run with its context
+    (see contextvars.copy_context).
+    """
+    def __init__(self):
+        self.totals = Recorder(window=QUANTILE_WINDOW)
+
+    def _targets(self):
+        return (self.totals,) + _RECORDERS.get()
+
+    def count(self, name, value=1):
+        for recorder in self._targets():
+            recorder.count(name, value)
+
+    def observe(self, stage, seconds):
+        for recorder in self._targets():
+            recorder.observe(stage, seconds)
+
+    def merge(self, exported):
+        """Adds what a recorder in another process (a parse worker) saw."""
+        for recorder in self._targets():
+            recorder.merge(exported)
+
+    @contextmanager
+    def timer(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    @contextmanager
+    def recording(self):
+        """Yields a Recorder that sees everything recorded in this context until the block exits."""
+        recorder = Recorder()
+        _RECORDERS.set(_RECORDERS.get() + (recorder,))
+        try:
+            yield recorder
+        finally:
+            # Not ContextVar.reset(): a sweep generator may be closed from another context
+            _RECORDERS.set(tuple(r for r in _RECORDERS.get() if r is not recorder))
+
+    def prometheus(self):
+        """The totals in the Prometheus text exposition format."""
+        lines = []
+        with self.totals._lock:
+            counters = dict(self.totals.counters)
+        for name, value in sorted(counters.items()):
+            lines.append(f"# TYPE sweep_{name}_total counter")
+            lines.append(f"sweep_{name}_total {value}")
+
+        lines.append("# HELP sweep_stage_seconds Time spent per sweep stage (quantiles over recent calls).")
+        lines.append("# TYPE sweep_stage_seconds summary")
+        for stage, stats in self.totals.stages().items():
+            label = f'stage="{stage}"'
+            lines.append(f'sweep_stage_seconds{{{label},quantile="0.5"}} {stats["p50_ms"] / 1000}')
+            lines.append(f'sweep_stage_seconds{{{label},quantile="0.95"}} {stats["p95_ms"] / 1000}')
+            lines.append(f"sweep_stage_seconds_sum{{{label}}} {stats['total_s']}")
+            lines.append(f"sweep_stage_seconds_count{{{label}}} {stats['calls']}")
+
+        lines.append("# TYPE process_max_resident_memory_bytes gauge")
+        lines.append(f"process_max_resident_memory_bytes {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}")
+        return "\n".join(lines) + "\n"
+
+METRICS = Metrics()
+
+class SweepReport:
+    """
+    One sweep's stage timings, counters, row statuses and peak memory.
+    run_sweep opens it with start() and closes it with finish(); to_dict()
+    is the JSON report, which save() also writes under REPORT_DIR.
+    """
+    def __init__(self, trace=None):
+        self.trace = SWEEP_TRACEMALLOC if trace is None else trace
+        self.statuses = {}
+        self.started_at = self.finished_at = None
+        self.peak_traced = None
+        self._recording = None
+        self._recorder = None
+        self._traced_here = False
+
+    def start(self):
+        self.started_at = time.time()
+        self._recording = METRICS.recording()
+        self._recorder = self._recording.__enter__()
+        if self.trace:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+                self._traced_here = True
+        return self
+
+    def result(self, result):
+        self.statuses[result["status"]] = self.statuses.get(result["status"], 0) + 1
+
+    def finish(self):
+        if self._recording is None:
+            return
+        if self.trace and tracemalloc.is_tracing():
+            self.peak_traced = tracemalloc.get_traced_memory()[1]
+            if self._traced_here:
+                tracemalloc.stop()
+        self._recording.__exit__(None, None, None)
+        self._recording = None
+        self.finished_at = time.time()
+
+    def to_dict(self):
+        counters = {}
+        if self._recorder:
+            with self._recorder._lock:
+                counters = dict(self._recorder.counters)
+        fetches = counters.get("fetches", 0)
+        routed = counters.get("route_hits", 0) + counters.get("route_misses", 0)
+        seconds = (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+        rows = sum(self.statuses.values())
+        return {
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "seconds": round(seconds, 3),
+            "rows": rows,
+            "rows_per_second": round(rows / seconds, 2) if seconds else None,
+            "statuses": dict(self.statuses),
+            "fallback_rate": round(counters.get("fetch_fallbacks", 0) / fetches, 3) if fetches else None,
+            "route_hit_rate": round(counters.get("route_hits", 0) / routed, 3) if routed else None,
+            "counters": counters,
+            "stages": self._recorder.stages() if self._recorder else {},
+            "peak_traced_mb": None if self.peak_traced is None else round(self.peak_traced / 1e6, 1),
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+    def save(self, path=None):
+        """Writes the report as JSON (default: a new file in REPORT_DIR, pruned to SWEEP_REPORTS_KEPT). Returns the path."""
+        if path is None:
+            os.makedirs(REPORT_DIR, exist_ok=True)
+            stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at or time.time()))
+            path = os.path.join(REPORT_DIR, f"sweep-{stamp}-{id(self) % 10000:04d}.json")
+            old = sorted(name for name in os.listdir(REPORT_DIR) if name.startswith("sweep-"))
+            for name in old[:max(0, len(old) - SWEEP_REPORTS_KEPT + 1)]:
+                os.remove(os.path.join(REPORT_DIR, name))
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=1)
+        return path
@@ -0,0 +1,283 @@
+# To recheck pages as often as they actually change, instead of sweeping every row every time
+"""
+Usage: python -m utils.monitor competitors.csv [--once] [--no-push] [--status]
+"""
+import argparse
+import heapq
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+from utils.journal import row_key
+from utils.storage import HISTORY, get_snapshot_key, push_bulk_snapshots
+from utils.sweep import CHANGED, ERROR, read_rows, run_sweep
+
+MONITOR_STATE_PATH = os.path.join('data', 'cache', 'monitor.json')
+# Bounds on the time between two checks of a page, and the starting guess for new pages
+MONITOR_MIN_INTERVAL = float(os.getenv("MONITOR_MIN_INTERVAL", "900"))
+MONITOR_MAX_INTERVAL = float(os.getenv("MONITOR_MAX_INTERVAL", str(7 * 86400)))
+MONITOR_DEFAULT_INTERVAL = float(os.getenv("MONITOR_DEFAULT_INTERVAL", "86400"))
+# Checks per expected change: 2 means a page that changes daily is checked every 12 hours
+MONITOR_CHECKS_PER_CHANGE = float(os.getenv("MONITOR_CHECKS_PER_CHANGE", "2"))
+MONITOR_BATCH_SIZE = int(os.getenv("MONITOR_BATCH_SIZE", "50")) # Due pages swept together
+MONITOR_PUSH_EVERY = float(os.getenv("MONITOR_PUSH_EVERY", "3600")) # Seconds between snapshot pushes
+# Retry delay after an error, doubled per consecutive error up to the max
+MONITOR_ERROR_BACKOFF = float(os.getenv("MONITOR_ERROR_BACKOFF", "600"))
+MONITOR_MAX_BACKOFF = float(os.getenv("MONITOR_MAX_BACKOFF", "86400"))
+RATE_DECAY = 0.9 # Weight kept by older observations at each check
+HOST_ERROR_CODES = (None, 403, 429, 503) # Errors that hold back every page on the host, not just this one
+
+def _clamp(value, low, high):
+    return max(low, min(high, value))
+
+class Monitor:
+    """
+    Schedules rechecks of config sheet rows. Each page keeps a decayed count
+    of changes seen and of seconds watched; their ratio (with a prior of one
+    change per MONITOR_DEFAULT_INTERVAL) is its change rate, and the next
+    check comes after 1 / (rate * MONITOR_CHECKS_PER_CHANGE), within the
+    interval bounds. New pages start from their snapshot history.
+
+    Errors back off exponentially, for the page and, for blocks and failed
+    connections, for its whole host. Due pages come off a heap of
+    (next_check, key); the state is saved as JSON.
+    """
+    def __init__(self, path=MONITOR_STATE_PATH, history=HISTORY):
+        self.path = path
+        self.history = history
+        self.pages = {}
+        self.hosts = {}
+        self.rows = {}
+        self._heap = []
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        self.pages = state.get("pages", {})
+        self.hosts = state.get("hosts", {})
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"pages": self.pages, "hosts": self.hosts}, f)
+        os.replace(tmp_path, self.path)
+
+    # --- Rows ---
+    def _seed(self, row, now):
+        """A new page's state, with its change rate learnt from snapshot history if there is any."""
+        changes, watched = 0.0, 0.0
+        if self.history is not None:
+            key = get_snapshot_key(row["company"], row["url type"])
+            first = self.history.first_recorded(key)
+            if first is not None:
+                changes = float(len(self.history.change_times(key)))
+                watched = now - first
+        page = {"changes": changes, "watched": watched, "last_checked": None, "errors": 0, "next_check": now}
+        page["interval"] = self._interval(page)
+        return page
+
+    def sync(self, rows, now=None):
+        """Monitors exactly these rows: new ones are due now, removed ones are dropped."""
+        now = time.time() if now is None else now
+        self.rows = {row_key(row): row for row in rows}
+        for key, row in self.rows.items():
+            if key not in self.pages:
+                self.pages[key] = self._seed(row, now)
+        for key in list(self.pages):
+            if key not in self.rows:
+                del self.pages[key]
+        for page in self.pages.values():
+            if page["next_check"] is None: # Taken by a batch that never reported back
+                page["next_check"] = now
+        self._heap = [(page["next_check"], key) for key, page in self.pages.items()]
+        heapq.heapify(self._heap)
+
+    # --- Scheduling ---
+    @staticmethod
+    def rate(page):
+        """Estimated changes per second."""
+        return (page["changes"] + 1) / (page["watched"] + MONITOR_DEFAULT_INTERVAL)
+
+    def _interval(self, page):
+        return _clamp(1 / (self.rate(page) * MONITOR_CHECKS_PER_CHANGE), MONITOR_MIN_INTERVAL, MONITOR_MAX_INTERVAL)
+
+    def _schedule(self, key, when):
+        self.pages[key]["next_check"] = when
+        heapq.heappush(self._heap, (when, key))
+
+    def next_due(self):
+        """When the next page is due, or None if nothing is monitored."""
+        while self._heap:
+            when, key = self._heap[0]
+            if key in self.pages and self.pages[key]["next_check"] == when:
+                return when
+            heapq.heappop(self._heap) # Rescheduled or dropped since
+        return None
+
+    def due(self, now=None, limit=MONITOR_BATCH_SIZE):
+        """Pops up to limit rows due by now. Pages on a host that is backing off wait for it."""
+        now = time.time() if now is None else now
+        rows = []
+        while len(rows) < limit:
+            when = self.next_due()
+            if when is None or when > now:
+                break
+            _, key = heapq.heappop(self._heap)
+            host = self.hosts.get(urlparse(self.rows[key]["url"]).hostname or "")
+            if host and host["until"] > now:
+                self._schedule(key, host["until"])
+                continue
+            self.pages[key]["next_check"] = None # In flight
+            rows.append(self.rows[key])
+        return rows
+
+    def observe(self, result, now=None):
+        """Learns from a row's sweep result and schedules its next check. Returns the page state."""
+        now = time.time() if now is None else now
+        key = row_key({"company": result["company"], "url type": result["url_type"], "url": result["url"]})
+        page = self.pages.get(key)
+        if page is None:
+            return None
+        host_name = urlparse(result["url"]).hostname or ""
+
+        if result["status"] == ERROR:
+            page["errors"] += 1
+            delay = min(MONITOR_MAX_BACKOFF, MONITOR_ERROR_BACKOFF * 2 ** (page["errors"] - 1))
+            if result["status_code"] in HOST_ERROR_CODES:
+                host = self.hosts.setdefault(host_name, {"errors": 0, "until": 0})
+                if host["until"] <= now: # One step per round, however many of its pages failed
+                    host["errors"] += 1
+                    host["until"] = now + min(MONITOR_MAX_BACKOFF, MONITOR_ERROR_BACKOFF * 2 ** (host["errors"] - 1))
+            self._schedule(key, now + delay)
+            return page
+
+        if page["last_checked"] is not None:
+            page["changes"] = page["changes"] * RATE_DECAY + (1 if result["status"] == CHANGED else 0)
+            page["watched"] = page["watched"] * RATE_DECAY + (now - page["last_checked"])
+        page["last_checked"] = now
+        page["errors"] = 0
+        self.hosts.pop(host_name, None)
+        page["interval"] = self._interval(page)
+        self._schedule(key, now + page["interval"])
+        return page
+
+    def release(self, rows, now=None):
+        """Reschedules rows popped by due() that got no result, as after an error."""
+        now = time.time() if now is None else now
+        for row in rows:
+            key = row_key(row)
+            if key in self.pages and self.pages[key]["next_check"] is None:
+                self._schedule(key, now + MONITOR_ERROR_BACKOFF)
+
+    def status(self):
+        """[(row, page)] ordered by next check."""
+        return sorted(
+            ((self.rows[key], page) for key, page in self.pages.items() if key in self.rows),
+            key=lambda entry: entry[1]["next_check"] or 0,
+        )
+
+# --- Daemon ---
+def _hours(seconds):
+    return f"{seconds / 3600:.1f} h"
+
+def run_monitor(sheet, once=False, push=True, stop=None):
+    """
+    Sweeps the rows of sheet as they fall due, until stop (a threading.Event)
+    is set or, with once, until nothing is due. The sheet is re-read when it
+    changes on disk; if that fails, the last rows read stay monitored. A
+    batch that fails as a whole (e.g. a storage error) is logged and its
+    pages retried after MONITOR_ERROR_BACKOFF.
+    """
+    stop = stop or threading.Event()
+    monitor = Monitor()
+    sheet_mtime = None
+    last_push = time.time()
+
+    while not stop.is_set():
+        try:
+            mtime = os.path.getmtime(sheet)
+            if mtime != sheet_mtime:
+                monitor.sync(list(read_rows(sheet)))
+                sheet_mtime = mtime
+                print(f"Monitoring {len(monitor.rows)} page(s) from {sheet}", flush=True)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not read {sheet}, keeping the last {len(monitor.rows)} page(s): {e}", flush=True)
+
+        rows = monitor.due()
+        if rows:
+            try:
+                for result in run_sweep(rows, push=False):
+                    page = monitor.observe(result)
+                    label = f"{result['company']} ({result['url_type']})"
+                    if result["status"] == ERROR:
+                        print(f"🚨 {label}: {result['message']} — retry in {_hours(page['next_check'] - time.time())}", flush=True)
+                    else:
+                        new = f"{len(result['new_items'])} new item(s)" if result["status"] == CHANGED else "no change"
+                        print(f"{'🆕' if result['status'] == CHANGED else '✅'} {label}: {new} — next check in {_hours(page['interval'])}", flush=True)
+            except Exception as e:
+                print(f"❌ Sweep of {len(rows)} page(s) failed, unfinished ones retry in {_hours(MONITOR_ERROR_BACKOFF)}: {e!r}", flush=True)
+            finally:
+                monitor.release(rows) # Rows the sweep never reported back
+            monitor.save()
+
+        if push and time.time() - last_push >= MONITOR_PUSH_EVERY:
+            try:
+                push_bulk_snapshots()
+            except Exception as e:
+                print(f"❌ Snapshot push failed: {e!r}", flush=True)
+            last_push = time.time()
+        if rows:
+            continue # More may already be due
+
+        next_due = monitor.next_due()
+        if once:
+            break
+        # Wake for the next due page, or every minute to notice sheet edits
+        stop.wait(60 if next_due is None else _clamp(next_due - time.time(), 0, 60))
+
+    monitor.save()
+    if push:
+        push_bulk_snapshots()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recheck the pages of a config sheet as often as each one changes.")
+    parser.add_argument("sheet", help="CSV or XLSX with URL, Company and URL Type columns")
+    parser.add_argument("--once", action="store_true", help="check what is due now, then exit (e.g. from cron)")
+    parser.add_argument("--no-push", action="store_true", help="do not push snapshots to the remote")
+    parser.add_argument("--status", action="store_true", help="print the schedule and exit")
+    args = parser.parse_args(argv)
+
+    try:
+        rows = list(read_rows(args.sheet))
+    except (OSError, ValueError) as e:
+        print(f"❌ Could not read {args.sheet}: {e}", file=sys.stderr)
+        return 2
+
+    if args.status:
+        monitor = Monitor()
+        monitor.sync(rows)
+        now = time.time()
+        for row, page in monitor.status():
+            changes_per_week = Monitor.rate(page) * 7 * 86400
+            print(
+                f"{row['company']} ({row['url type']}): next in {_hours(max(0, page['next_check'] - now))}, "
+                f"every {_hours(page['interval'])}, ~{changes_per_week:.1f} change(s)/week, {page['errors']} error(s)"
+            )
+        return 0
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    run_monitor(args.sheet, once=args.once, push=not args.no_push, stop=stop)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+# To run a sweep as a pipeline: fetch threads -> parse processes -> one writer
+import gc
+import os
+import sys
+import threading
+import types
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from multiprocessing import get_context
+from utils.fetcher import fetch_many, normalize_url
+from utils.metrics import METRICS
+from utils.scraper import STREAM_PARSING, extract_page, page_sink
+
+def _usable_cpus():
+    """CPUs this process may run on (os.cpu_count() is the host's, even in a container)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError: # Not available on macOS or Windows
+        return os.cpu_count() or 1
+
+# Processes that parse and extract pages (0 = parse inline on the caller's thread).
+# Each one imports the scraping stack, so the default is capped for small boxes
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(min(4, _usable_cpus()))))
+# Fetched pages allowed to wait for or sit in the parse pool at once; when full,
+# the sweep stops taking pages from the fetchers (which stop starting requests)
+PARSE_QUEUE_SIZE = int(os.getenv("PARSE_QUEUE_SIZE", str(2 * max(1, PARSE_WORKERS))))
+
+# --- Parse pool ---
+_POOL = None
+_POOL_WORKERS = 0
+_POOL_LOCK = threading.Lock()
+
+def parse_pool(workers):
+    """
+    The shared process pool for the parse stage, created on first use and kept
+    across sweeps. Uses "spawn" so fetch threads' locks never leak into children.
+    """
+    global _POOL, _POOL_WORKERS
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_WORKERS != workers:
+            if _POOL is not None:
+                _POOL.shutdown(wait=False, cancel_futures=True)
+            _POOL = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+            _POOL_WORKERS = workers
+        return _POOL
+
+def _discard_pool(pool):
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is pool:
+            _POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+@contextmanager
+def _plain_main():
+    """
+    Hides the running script from processes spawned meanwhile, which would
+    otherwise re-run it on start (Streamlit runs app.py as __main__).
+    Workers are only spawned from submit(), so wrapping that is enough.
+    """
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+def _parse(html, url, profile):
+    page = extract_page(html, url, profile=profile)
+    gc.collect() # Soup trees are reference cycles; free them before the next page
+    return page
+
+def _parse_in_worker(html, url, profile):
+    """Runs in a parse process. Returns the page and the metrics recorded for it."""
+    with METRICS.recording() as recorded:
+        page = _parse(html, url, profile)
+    return page, recorded.export()
+
+def _submit(pool, html, url, profile):
+    with _plain_main():
+        return pool.submit(_parse_in_worker, html, url, profile)
+
+# --- Planning ---
+def plan_sweep(jobs):
+    """
+    Groups (tag, url, profile) jobs by fetch target, the normalized URL plus
+    extraction profile, so a page listed under several URL Types is fetched
+    and extracted once. Returns [(url, profile, tags)] in first-seen order.
+    """
+    groups = {}
+    for tag, url, profile in jobs:
+        groups.setdefault((normalize_url(url), profile), []).append(tag)
+    return [(url, profile, tags) for (url, profile), tags in groups.items()]
+
+# --- Pipeline ---
+def sweep_pages(jobs, workers=None, max_pending=None, fetch_workers=None):
+    """
+    Fetches and parses (tag, url, profile) jobs, yielding
+    (tag, page, source, status_code) as each page is ready, where page is
+    extract_page's (items, error), or None if nothing was
+    fetched (an error status or NOT_MODIFIED). Jobs are planned first
+    (see plan_sweep) and each result is fanned out to every tag sharing
+    its target. Fetching runs on fetch_many's threads and parsing in the
+    parse pool, so the caller's thread is left as the single writer
+    (diffing and saving snapshots).
+    """
+    workers = PARSE_WORKERS if workers is None else workers
+    max_pending = max_pending or PARSE_QUEUE_SIZE
+    plan = plan_sweep(jobs)
+    url_profiles = {url: profile for url, profile, _ in plan}
+
+    def fetch_jobs():
+        for url, profile, tags in plan:
+            yield (tags, url, profile), url
+
+    # Streaming sinks extract while downloading, on the fetch threads
+    sink = page_sink(url_profiles) if STREAM_PARSING else None
+    fetched = fetch_many(fetch_jobs(), max_workers=fetch_workers, sink=sink)
+
+    if workers <= 0 or STREAM_PARSING:
+        for (tags, url, profile), html, source, status_code in fetched:
+            if isinstance(html, str):
+                html = _parse(html, url, profile)
+            for tag in tags:
+                yield tag, html, source, status_code
+        return
+
+    pool = parse_pool(workers)
+    pending = {}
+
+    def finished(future):
+        tags, source, status_code = pending.pop(future)
+        try:
+            page, recorded = future.result()
+            METRICS.merge(recorded)
+        except BrokenProcessPool as e:
+            _discard_pool(pool) # A worker died; the next sweep starts a fresh pool
+            page = [], f"Parse worker crashed: {e}"
+        except Exception as e:
+            page = [], f"Parse failed: {e}"
+        return [(tag, page, source, status_code) for tag in tags]
+
+    for (tags, url, profile), html, source, status_code in fetched:
+        if html is None:
+            for tag in tags:
+                yield tag, None, source, status_code
+            continue
+
+        # Backpressure: wait for a parse slot before taking more pages
+        while len(pending) >= max_pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from finished(future)
+
+        try:
+            future = _submit(pool, html, url, profile)
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            pool = parse_pool(workers)
+            future = _submit(pool, html, url, profile)
+        pending[future] = (tags, source, status_code)
+        del html
+
+        for future in [f for f in pending if f.done()]:
+            yield from finished(future)
+
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield from finished(future)
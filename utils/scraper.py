@@ -1,31 +1,274 @@
 # To scrape the contents of a site
-from bs4 import BeautifulSoup
+import os
+from bisect import bisect_left, bisect_right
+from html.parser import HTMLParser
+from bs4 import BeautifulSoup, CData, NavigableString, Tag
 import re
+import soupsieve
 from urllib.parse import urljoin
+from utils.metrics import METRICS
 
-def extract_items(html_content, base_url):
-    junk_keywords = ["skip", "main menu", "footer", "cookie"]
-    soup = BeautifulSoup(html_content, 'html.parser')
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    from lxml import etree, html as lxml_html # BeautifulSoup's "lxml" tree builder, and XPath extraction profiles
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+# Parser backend: "html.parser", "lxml", "selectolax", or "auto" (fastest installed).
+# A backend that is not installed falls back to the next one down.
+SCRAPER_PARSER = os.getenv("SCRAPER_PARSER", "html.parser")
+PARSER_FALLBACKS = ["selectolax", "lxml", "html.parser"]
+
+CANDIDATE_TAGS = frozenset(['article', 'li', 'tr', 'div', 'section', 'p'])
+JUNK_KEYWORDS = ["skip", "main menu", "footer", "cookie"]
+DATE_PATTERN = re.compile(r'(\d{4}[-/]\d{1,2}[-/]\d{1,2})')
+_DATE_STARTS = re.compile(r'(?=\d{4}[-/]\d{1,2}[-/]\d{1,2})')
+_TEXT_TYPES = (NavigableString, CData) # What get_text() counts inside a block tag
+_NON_TEXT_PARENTS = frozenset(['script', 'style', 'template', 'rt', 'rp']) # Same exclusions for selectolax
+
+# Feed pages to StreamExtractor chunk by chunk as they download instead of
+# building the whole text and tree first (see fetcher.fetch_html's sink)
+STREAM_PARSING = os.getenv("STREAM_PARSING", "0") == "1"
+# Tags BeautifulSoup treats as self-closing, and whose text it does not count
+_VOID_TAGS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem',
+    'meta', 'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame',
+    'image', 'isindex', 'nextid', 'spacer',
+])
+_STRING_CONTAINERS = frozenset(['script', 'style', 'template', 'rt', 'rp'])
+_JUNK_PATTERNS = [re.compile(re.escape(j)) for j in JUNK_KEYWORDS]
+_JUNK_OVERLAP = max(len(j) for j in JUNK_KEYWORDS) - 1
+_DATE_OVERLAP = 9 # Longest DATE_PATTERN prefix that may still complete ("2024-12-" + digit)
+_DATE_MAX_LEN = 10
+
+# Dynamic content that should not trigger a 'new update' detection, as one
+# pattern applied to each text node after parsing (markup and hrefs untouched)
+NORMALIZE_PATTERN = re.compile(
+    r'\b\d{4}-\d{2}-\d{2}\b'                   # ISO dates
+    r'|\b\d{1,2}:\d{2}(?:\s?[APMapm]{2})?\b'     # time of day
+    r'|\d{4}/\d{2}/\d{2}'                        # alt date format
+    r'|(?i:Last updated|Published on).+'        # "Last updated ..." to the end of the text node
+    r'|\b\d+\b',                                 # counters, views and other bare numbers
+    re.DOTALL,
+)
+
+# clean_html's passes over raw markup, compiled once
+_CLEAN_PASSES = [
+    (re.compile(r'\b\d{4}-\d{2}-\d{2}\b'), ''),
+    (re.compile(r'\b\d{1,2}:\d{2}(?:\s?[APMapm]{2})?\b'), ''),
+    (re.compile(r'\d{4}/\d{2}/\d{2}'), ''),
+    (re.compile(r'(Last updated|Published on)[^<]+', re.IGNORECASE), ''),
+    (re.compile(r'\b\d+\b'), ''),
+]
+
+def available_parsers():
+    """Parser backends usable in this environment, fastest first."""
+    installed = {"selectolax": LexborHTMLParser is not None, "lxml": HAS_LXML, "html.parser": True}
+    return [name for name in PARSER_FALLBACKS if installed[name]]
+
+def resolve_parser(name=None):
+    """Maps a requested backend (or SCRAPER_PARSER) to one that is installed."""
+    name = name or SCRAPER_PARSER
+    available = available_parsers()
+    if name == "auto":
+        return available[0]
+    if name not in PARSER_FALLBACKS:
+        raise ValueError(f"Unknown parser backend: {name}")
+    for candidate in PARSER_FALLBACKS[PARSER_FALLBACKS.index(name):]:
+        if candidate in available:
+            return candidate
+
+def parse_html(html_content, parser=None):
+    """Parses html_content with the resolved backend. Returns (backend, document)."""
+    backend = resolve_parser(parser)
+    with METRICS.timer("parse"):
+        if backend == "selectolax":
+            return backend, LexborHTMLParser(html_content)
+        return backend, BeautifulSoup(html_content, backend)
+
+# --- Single-pass indexing ---
+class _TextIndex:
+    """
+    Concatenates every stripped string of a document into one text (and its
+    lowercase twin) while recording, for each candidate tag, its [start, end)
+    range in that text and the href of its first descendant <a>.
+    """
+    def __init__(self, normalize=False):
+        self.normalize = normalize
+        self.parts, self.lower_parts = [], []
+        self.pos = self.lower_pos = 0
+        self.hrefs = [] # href ("" if missing) of every <a>, in document order
+        self.spans = []
+
+    def add_text(self, text):
+        if self.normalize:
+            text = NORMALIZE_PATTERN.sub('', text)
+        text = text.strip()
+        if text:
+            lower = text.lower()
+            self.parts.append(text)
+            self.lower_parts.append(lower)
+            self.pos += len(text)
+            self.lower_pos += len(lower)
+
+    def open_candidate(self):
+        span = [self.pos, None, self.lower_pos, None, len(self.hrefs)]
+        self.spans.append(span)
+        return span
+
+    def close_candidate(self, span):
+        first_anchor = span[4]
+        span[1], span[3] = self.pos, self.lower_pos
+        span[4] = self.hrefs[first_anchor] if len(self.hrefs) > first_anchor else None
+
+    def result(self):
+        return "".join(self.parts), "".join(self.lower_parts), self.spans
+
+def _index_soup(soup, normalize=False):
+    """Walks a BeautifulSoup tree once (see _TextIndex)."""
+    index = _TextIndex(normalize)
+    stack = [(iter(soup.contents), None)]
+    while stack:
+        children, span = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            if span is not None:
+                index.close_candidate(span)
+            continue
+
+        if isinstance(child, Tag):
+            span = index.open_candidate() if child.name in CANDIDATE_TAGS else None
+            if child.name == 'a':
+                index.hrefs.append(child.get('href') or "")
+            stack.append((iter(child.contents), span))
+        elif type(child) in _TEXT_TYPES:
+            index.add_text(child)
+
+    return index.result()
+
+def _index_lexbor(tree, normalize=False):
+    """Walks a selectolax tree once (see _TextIndex)."""
+    index = _TextIndex(normalize)
+    stack = [("node", tree.root, None)]
+    while stack:
+        kind, node, parent_tag = stack.pop()
+        if kind == "close":
+            index.close_candidate(node)
+            continue
+        if node is None:
+            continue
+
+        # The sibling is visited once this node's whole subtree is done
+        stack.append(("node", node.next, parent_tag))
+        tag = node.tag
+        if tag == '-text':
+            if parent_tag not in _NON_TEXT_PARENTS:
+                index.add_text(node.text_content or "")
+            continue
+        if tag.startswith('-'): # comments, doctype
+            continue
+
+        if tag in CANDIDATE_TAGS:
+            stack.append(("close", index.open_candidate(), None))
+        if tag == 'a':
+            index.hrefs.append(node.attributes.get('href') or "")
+        stack.append(("node", node.child, tag))
+
+    return index.result()
+
+def _first_date(text, date_starts, start, end):
+    """First DATE_PATTERN match inside text[start:end], without slicing."""
+    for i in range(bisect_left(date_starts, start), len(date_starts)):
+        if date_starts[i] >= end:
+            break
+        match = DATE_PATTERN.match(text, date_starts[i], end)
+        if match:
+            return match.group(0)
+    return None
+
+def extract_items(html_content, base_url, parser=None, normalize=False):
+    return extract_items_from_document(parse_html(html_content, parser), base_url, normalize)
+
+def extract_page(html_content, base_url, parser=None, profile=None):
+    """
+    The sweep's parse stage: extracts items from raw HTML with every text node
+    normalized (replaces clean_html + extract_items). Returns (items, error).
+    With an ExtractionProfile, its selectors are tried first and the generic
+    scan only runs if they match nothing. Timed as the "extract" stage (which
+    includes "parse").
+    """
+    with METRICS.timer("extract"):
+        page = _extract_page(html_content, base_url, parser, profile)
+    _count_page(page)
+    return page
+
+def _count_page(page):
+    items, error = page
+    METRICS.count("pages_extracted")
+    METRICS.count("items_extracted", len(items))
+    if error:
+        METRICS.count("extract_errors")
+
+def _extract_page(html_content, base_url, parser, profile):
+    parsed = None
+    if profile is not None:
+        if profile.syntax == "xpath":
+            items = profile.extract_lxml(_lxml_document(html_content), base_url)
+        else:
+            parsed = parse_html(html_content, parser)
+            items = profile.extract(parsed, base_url)
+        if items:
+            return items, None
+        METRICS.count("profile_misses")
+        print(f"⚠️ Extraction profile matched nothing on {base_url} — falling back to the generic scan.")
+
+    return extract_items_from_document(parsed or parse_html(html_content, parser), base_url, normalize=True)
+
+def extract_items_from_document(parsed, base_url, normalize=False):
+    """Items from a (backend, document) pair from parse_html. Returns (items, error)."""
+    backend, document = parsed
     items = []
 
-    candidates = soup.find_all(['article', 'li', 'tr', 'div', 'section', 'p'])
+    if backend == "selectolax":
+        text, lower_text, spans = _index_lexbor(document, normalize)
+    else:
+        text, lower_text, spans = _index_soup(document, normalize)
+    junk_starts = [
+        (len(j), [m.start() for m in re.finditer(f"(?={re.escape(j)})", lower_text)])
+        for j in JUNK_KEYWORDS
+    ]
+    date_starts = [m.start() for m in _DATE_STARTS.finditer(text)]
+    full_links = {} # Nested candidates usually share their first <a>
 
-    for tag in candidates:
-        text = tag.get_text(strip=True)
-        if not text or any(j in text.lower() for j in junk_keywords):
+    for start, end, lower_start, lower_end, raw_link in spans:
+        if start == end:
             continue
 
-        link_tag = tag.find('a')
-        date_match = re.search(r'(\d{4}[-/]\d{1,2}[-/]\d{1,2})', text)
+        has_junk = False
+        for length, starts in junk_starts:
+            i = bisect_left(starts, lower_start)
+            if i < len(starts) and starts[i] + length <= lower_end:
+                has_junk = True
+                break
+        if has_junk:
+            continue
 
-        if link_tag and text:
-            raw_link = link_tag.get('href')
-            full_link = urljoin(base_url, raw_link) if raw_link else base_url
+        if raw_link is not None:
+            full_link = full_links.get(raw_link)
+            if full_link is None:
+                full_link = full_links[raw_link] = urljoin(base_url, raw_link) if raw_link else base_url
+            timestamp = _first_date(text, date_starts, start, end)
 
             items.append({
-                "title": text[:150],
+                "title": text[start:min(end, start + 150)],
                 "link": full_link,
-                "timestamp": date_match.group(0) if date_match else "unknown"
+                "timestamp": timestamp or "unknown"
             })
 
     if not items:
@@ -33,20 +276,399 @@ def extract_items(html_content, base_url):
 
     return items, None
 
+# --- Extraction profiles ---
+def _lxml_document(html_content):
+    if isinstance(html_content, str):
+        html_content = html_content.encode('utf-8')
+    return lxml_html.document_fromstring(html_content, parser=lxml_html.HTMLParser(encoding='utf-8'))
+
+class ExtractionProfile:
+    """
+    Selectors for one known page: container (required) finds each item, and
+    title, link and date are looked up inside it. Without title the whole
+    container's text is used; without link, its first <a>; without date,
+    the timestamp is "unknown". CSS by default (compiled once with soupsieve;
+    selectolax documents use the same strings), or XPath with
+    syntax="xpath", which needs lxml and may select attributes directly.
+    """
+    FIELDS = ("container", "title", "link", "date")
+
+    def __init__(self, container, title=None, link=None, date=None, syntax="css"):
+        if syntax not in ("css", "xpath"):
+            raise ValueError(f"Unknown selector syntax: {syntax}")
+        if syntax == "xpath" and not HAS_LXML:
+            raise ValueError("XPath profiles need lxml installed")
+        self.syntax = syntax
+        self.selectors = {"container": container, "title": title, "link": link, "date": date}
+        compile_selector = etree.XPath if syntax == "xpath" else soupsieve.compile
+        self.compiled = {name: compile_selector(sel) for name, sel in self.selectors.items() if sel}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(syntax=data.get("syntax", "css"), **{f: data.get(f) for f in cls.FIELDS})
+
+    def __reduce__(self):
+        # Compiled XPath can't be pickled; parse processes rebuild from the selectors
+        return _cached_profile, (self.syntax,) + tuple(self.selectors[f] for f in self.FIELDS)
+
+    def _item(self, title, href, date, base_url):
+        title = title[:150]
+        if not title or href is None:
+            return None
+        match = DATE_PATTERN.search(date or "")
+        return {
+            "title": title,
+            "link": urljoin(base_url, href) if href else base_url,
+            "timestamp": match.group(0) if match else (date or "unknown"),
+        }
+
+    def extract(self, parsed, base_url):
+        """Items from a (backend, document) pair from parse_html."""
+        backend, document = parsed
+        if backend == "selectolax":
+            return self._extract_lexbor(document, base_url)
+        return self._extract_soup(document, base_url)
+
+    def _extract_soup(self, soup, base_url):
+        def text_of(element):
+            return "".join(
+                NORMALIZE_PATTERN.sub('', s).strip() for s in element.descendants if type(s) in _TEXT_TYPES
+            )
+
+        items = []
+        for container in self.compiled["container"].select(soup):
+            title_el = self.compiled["title"].select_one(container) if "title" in self.compiled else container
+            if "link" in self.compiled:
+                link_el = self.compiled["link"].select_one(container)
+            else:
+                link_el = container if container.name == 'a' else container.find('a')
+            date_el = self.compiled["date"].select_one(container) if "date" in self.compiled else None
+
+            item = self._item(
+                text_of(title_el) if title_el is not None else "",
+                (link_el.get('href') or "") if link_el is not None else None,
+                (date_el.get('datetime') or date_el.get_text(strip=True)) if date_el is not None else None,
+                base_url,
+            )
+            if item:
+                items.append(item)
+        return items
+
+    def _extract_lexbor(self, tree, base_url):
+        def text_of(node):
+            return "".join(
+                NORMALIZE_PATTERN.sub('', n.text_content or "").strip()
+                for n in node.traverse(include_text=True)
+                if n.tag == '-text' and n.parent.tag not in _NON_TEXT_PARENTS
+            )
+
+        items = []
+        for container in tree.css(self.selectors["container"]):
+            title_el = container.css_first(self.selectors["title"]) if self.selectors["title"] else container
+            if self.selectors["link"]:
+                link_el = container.css_first(self.selectors["link"])
+            else:
+                link_el = container if container.tag == 'a' else container.css_first('a')
+            date_el = container.css_first(self.selectors["date"]) if self.selectors["date"] else None
+
+            item = self._item(
+                text_of(title_el) if title_el is not None else "",
+                (link_el.attributes.get('href') or "") if link_el is not None else None,
+                (date_el.attributes.get('datetime') or date_el.text(strip=True)) if date_el is not None else None,
+                base_url,
+            )
+            if item:
+                items.append(item)
+        return items
+
+    def extract_lxml(self, document, base_url):
+        """Items from an lxml.html document (XPath profiles)."""
+        def first(name, context):
+            results = self.compiled[name](context)
+            return results[0] if results else None
+
+        def text_of(result):
+            if isinstance(result, str): # An attribute or text() selected directly
+                return NORMALIZE_PATTERN.sub('', result).strip()
+            return "".join(NORMALIZE_PATTERN.sub('', t).strip() for t in _LXML_TEXT(result))
+
+        items = []
+        for container in self.compiled["container"](document):
+            title_el = first("title", container) if "title" in self.compiled else container
+            if "link" in self.compiled:
+                link_el = first("link", container)
+            else:
+                link_el = container if container.tag == 'a' else container.find('.//a')
+            date_el = first("date", container) if "date" in self.compiled else None
+
+            if link_el is None or isinstance(link_el, str):
+                href = link_el
+            else:
+                href = link_el.get('href') or ""
+            if date_el is None or isinstance(date_el, str):
+                date = date_el
+            else:
+                date = date_el.get('datetime') or date_el.text_content().strip()
+
+            item = self._item(text_of(title_el) if title_el is not None else "", href, date, base_url)
+            if item:
+                items.append(item)
+        return items
+
+if HAS_LXML:
+    _LXML_TEXT = etree.XPath(".//text()[not(ancestor::script or ancestor::style or ancestor::template)]")
+
+# Profiles unpickled in this process, by (syntax, *selectors), so each is compiled once per worker
+_PROFILE_CACHE = {}
+PROFILE_CACHE_SIZE = 1024
+
+def _cached_profile(syntax, *selectors):
+    key = (syntax,) + selectors
+    profile = _PROFILE_CACHE.get(key)
+    if profile is None:
+        if len(_PROFILE_CACHE) >= PROFILE_CACHE_SIZE:
+            _PROFILE_CACHE.clear()
+        profile = _PROFILE_CACHE[key] = ExtractionProfile(*selectors, syntax=syntax)
+    return profile
+
+class BufferedExtractor:
+    """Sink for fetch_html that keeps the whole page and runs extract_page on close (for profiled pages)."""
+    def __init__(self, base_url, profile=None):
+        self.base_url = base_url
+        self.profile = profile
+        self.chunks = []
+
+    def feed(self, data):
+        self.chunks.append(data)
+        return []
+
+    def close(self):
+        return extract_page("".join(self.chunks), self.base_url, profile=self.profile)
+
+def page_sink(profiles_by_url):
+    """fetch_html sink factory: streams generic pages, buffers pages that have a profile."""
+    def sink(url):
+        profile = profiles_by_url.get(url)
+        return StreamExtractor(url) if profile is None else BufferedExtractor(url, profile)
+    return sink
+
+# --- Streaming extraction ---
+class _StreamText:
+    """Append-only text addressed by absolute offsets; clear() drops what is buffered."""
+    def __init__(self):
+        self.parts, self.ends = [], []
+        self.base = self.pos = 0
+
+    def append(self, text):
+        self.parts.append(text)
+        self.pos += len(text)
+        self.ends.append(self.pos)
+
+    def slice(self, start, end):
+        i = bisect_right(self.ends, start)
+        part_start = self.ends[i - 1] if i else self.base
+        out = []
+        while i < len(self.parts) and part_start < end:
+            out.append(self.parts[i][max(start - part_start, 0):end - part_start])
+            part_start = self.ends[i]
+            i += 1
+        return "".join(out)
+
+    def clear(self):
+        self.parts.clear()
+        self.ends.clear()
+        self.base = self.pos
+
+class StreamExtractor(HTMLParser):
+    """
+    Incremental extract_page: feed() it decoded chunks as they arrive and it
+    returns the items whose candidate container closed in them. Only the text
+    of still-open candidates is buffered. close() returns
+    (items, error) with items in document order, as extract_page does.
+    Builds the same tree as BeautifulSoup's html.parser backend.
+    """
+    def __init__(self, base_url, normalize=True):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.normalize = normalize
+        self.text, self.lower = _StreamText(), _StreamText()
+        self.junk_starts = [[] for _ in JUNK_KEYWORDS]
+        self.date_starts = []
+        self.data = [] # Text since the last tag; BeautifulSoup makes it one string
+        self.tags = [] # Open tags: [name, span or None]
+        self.spans = [] # Open candidates: [order, start, lstart, href or None]
+        self.containers = 0 # Open script/style/template/rt/rp tags
+        self.full_links = {}
+        self.items = []
+        self.emitted = []
+        self.order = 0
+
+    # -- Text --
+    def _flush(self):
+        if not self.data:
+            return
+        text = "".join(self.data)
+        self.data = []
+        if self.containers:
+            return
+        if self.normalize:
+            text = NORMALIZE_PATTERN.sub('', text)
+        text = text.strip()
+        if not text:
+            return
+        lower = text.lower()
+        if not self.spans: # Outside every candidate - only the offsets matter
+            self.text.pos += len(text)
+            self.lower.pos += len(lower)
+            self.text.clear()
+            self.lower.clear()
+            return
+
+        # Re-scan a short overlap so matches spanning two strings are found
+        window_start = max(self.lower.pos - _JUNK_OVERLAP, self.lower.base)
+        window = self.lower.slice(window_start, self.lower.pos) + lower
+        for pattern, starts in zip(_JUNK_PATTERNS, self.junk_starts):
+            for match in pattern.finditer(window):
+                position = window_start + match.start()
+                if not starts or position > starts[-1]:
+                    starts.append(position)
+        window_start = max(self.text.pos - _DATE_OVERLAP, self.text.base)
+        window = self.text.slice(window_start, self.text.pos) + text
+        for match in _DATE_STARTS.finditer(window):
+            position = window_start + match.start()
+            if not self.date_starts or position > self.date_starts[-1]:
+                self.date_starts.append(position)
+
+        self.text.append(text)
+        self.lower.append(lower)
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    def unknown_decl(self, data):
+        self._flush()
+        if data.upper().startswith('CDATA['):
+            self.data.append(data[len('CDATA['):])
+            self._flush()
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    # -- Tags --
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        span = None
+        if tag in CANDIDATE_TAGS:
+            span = [self.order, self.text.pos, self.lower.pos, None]
+            self.order += 1
+            self.spans.append(span)
+        if tag == 'a':
+            href = dict(attrs).get('href') or ""
+            for open_span in reversed(self.spans): # Spans without a link are always the innermost
+                if open_span[3] is not None:
+                    break
+                open_span[3] = href
+        if tag in _VOID_TAGS:
+            if span is not None:
+                self._close(span)
+            return
+        if tag in _STRING_CONTAINERS:
+            self.containers += 1
+        self.tags.append([tag, span])
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        self._flush()
+        for i in range(len(self.tags) - 1, -1, -1):
+            if self.tags[i][0] == tag:
+                break
+        else:
+            return # Stray end tag
+        while len(self.tags) > i:
+            name, span = self.tags.pop()
+            if name in _STRING_CONTAINERS:
+                self.containers -= 1
+            if span is not None:
+                self._close(span)
+
+    def _close(self, span):
+        self.spans.pop() # Tags close innermost first, so span is the last one opened
+        order, start, lower_start, raw_link = span
+        end, lower_end = self.text.pos, self.lower.pos
+
+        if start != end and raw_link is not None and not self._has_junk(lower_start, lower_end):
+            full_link = self.full_links.get(raw_link)
+            if full_link is None:
+                full_link = self.full_links[raw_link] = urljoin(self.base_url, raw_link) if raw_link else self.base_url
+            item = {
+                "title": self.text.slice(start, min(end, start + 150)),
+                "link": full_link,
+                "timestamp": self._first_date(start, end) or "unknown",
+            }
+            self.items.append((order, item))
+            self.emitted.append(item)
+
+        if not self.spans:
+            self.text.clear()
+            self.lower.clear()
+            self.date_starts.clear()
+            for starts in self.junk_starts:
+                starts.clear()
+
+    def _has_junk(self, lower_start, lower_end):
+        for keyword, starts in zip(JUNK_KEYWORDS, self.junk_starts):
+            i = bisect_left(starts, lower_start)
+            if i < len(starts) and starts[i] + len(keyword) <= lower_end:
+                return True
+        return False
+
+    def _first_date(self, start, end):
+        for i in range(bisect_left(self.date_starts, start), len(self.date_starts)):
+            position = self.date_starts[i]
+            if position >= end:
+                break
+            match = DATE_PATTERN.match(self.text.slice(position, min(position + _DATE_MAX_LEN, end)))
+            if match:
+                return match.group(0)
+        return None
+
+    # -- Driving --
+    def feed(self, data):
+        """Parses the next chunk; returns the items completed by it."""
+        super().feed(data)
+        emitted, self.emitted = self.emitted, []
+        return emitted
+
+    def close(self):
+        super().close()
+        self._flush()
+        while self.tags: # Unclosed tags end with the document
+            self.handle_endtag(self.tags[-1][0])
+        items = [item for _, item in sorted(self.items, key=lambda entry: entry[0])]
+        page = (items, None if items else "No extractable content found (unsupported structure)")
+        _count_page(page) # Its time is part of the "fetch" stage it streams in
+        return page
+
 def clean_html(html):
     """
     Removes dynamic, frequently changing content that should not trigger a 'new update' detection.
+    Works on raw markup (numbers in attributes and URLs go too); extract_page
+    normalizes text nodes instead. Kept for snapshots taken before that.
     """
     if not html:
         return ""
 
-    # Remove common timestamp patterns (e.g., '2025-07-27', '12:45 PM')
-    html = re.sub(r'\b\d{4}-\d{2}-\d{2}\b', '', html)  # ISO dates
-    html = re.sub(r'\b\d{1,2}:\d{2}(?:\s?[APMapm]{2})?\b', '', html)  # time of day
-    html = re.sub(r'\d{4}/\d{2}/\d{2}', '', html)  # alt date format
-    html = re.sub(r'(Last updated|Published on)[^<]+', '', html, flags=re.IGNORECASE)
-
-    # Optional: Remove numbers that could be dynamic (e.g., counters, views)
-    html = re.sub(r'\b\d+\b', '', html)
+    for pattern, replacement in _CLEAN_PASSES:
+        html = pattern.sub(replacement, html)
 
-    return html
\ No newline at end of file
+    return html
@@ -1,20 +1,47 @@
 import os
 import json
-import hashlib
-import base64
-import requests
-import zipfile
-from io import BytesIO
+import threading
+from collections import OrderedDict
+from contextvars import copy_context
+from utils.backends import (
+    DirBackend, GitHubBackend, SQLiteBackend, ZipBackend,
+    item_digest, pack_digests, unpack_digests,
+)
+from utils.history import SnapshotHistory
+from utils.metrics import METRICS
+from utils.scraper import ExtractionProfile, clean_html
 
 # --- Paths & Config ---
 SNAPSHOT_DIR = os.path.join('data', 'snapshots')
 ZIP_FILENAME = "snapshots.zip"
 ZIP_PATH_LOCAL = os.path.join(SNAPSHOT_DIR, ZIP_FILENAME)
+DB_PATH_LOCAL = os.path.join(SNAPSHOT_DIR, "snapshots.db")
+FILES_DIR_LOCAL = os.path.join(SNAPSHOT_DIR, "files") # Checkout of per-key files pushed in delta mode
+REMOTE_ZIP_TTL = float(os.getenv("REMOTE_ZIP_TTL", "3600")) # Seconds before the GitHub zip is re-downloaded
+SNAPSHOT_CACHE_SIZE = int(os.getenv("SNAPSHOT_CACHE_SIZE", "64")) # Decoded snapshots kept in memory
+PROFILES_PATH = os.path.join(SNAPSHOT_DIR, "profiles.json") # Per-page extraction profiles
+HISTORY_PATH = os.path.join(SNAPSHOT_DIR, "history.db") # Every version of every snapshot, as item deltas
+SNAPSHOT_HISTORY = os.getenv("SNAPSHOT_HISTORY", "1") == "1"
 
 UPDATED_FILES = set()
 GITHUB_OWNER = os.getenv("GITHUB_OWNER")
 GITHUB_REPO = os.getenv("GITHUB_REPO")
 GITHUB_BRANCH = os.getenv("GITHUB_BRANCH")
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+GITHUB_RAW_URL = os.getenv("GITHUB_RAW_URL", "https://raw.githubusercontent.com")
+
+# "zip" pushes the whole snapshots.zip; "delta" commits only the changed
+# snapshots as per-key files under REMOTE_FILES_DIR via the Git Data API
+SNAPSHOT_SYNC_MODE = os.getenv("SNAPSHOT_SYNC_MODE", "zip")
+REMOTE_FILES_DIR = "data/snapshots/files"
+SYNC_STATE_PATH = os.path.join('data', 'cache', 'github_sync.json')
+
+# Where snapshots live: "sqlite", "dir", "zip" or "github"
+SNAPSHOT_BACKEND = os.getenv("SNAPSHOT_BACKEND", "sqlite")
+# Remote read-fallback/push target: "github" or "none" (local-only mode)
+SNAPSHOT_REMOTE = os.getenv("SNAPSHOT_REMOTE", "github" if GITHUB_OWNER and GITHUB_REPO else "none")
+# Push to the remote on a background thread so a sweep never waits on GitHub
+SNAPSHOT_BACKGROUND_SYNC = os.getenv("SNAPSHOT_BACKGROUND_SYNC", "0") == "1"
 
 try:
     from streamlit.runtime.secrets import secrets
@@ -27,115 +54,256 @@ def get_snapshot_key(company_name, url_type):
     """Generates a consistent JSON filename inside the ZIP."""
     return f"{company_name}_{url_type}".replace(" ", "_") + ".json"
 
-def _load_zip_from_github():
-    """Fetches snapshots.zip from GitHub."""
-    try:
-        zip_url = f"https://raw.githubusercontent.com/{GITHUB_OWNER}/{GITHUB_REPO}/{GITHUB_BRANCH}/data/snapshots/{ZIP_FILENAME}"
-        r = requests.get(zip_url)
-        if r.status_code == 200:
-            return zipfile.ZipFile(BytesIO(r.content))
-    except Exception as e:
-        print(f"⚠️ Could not load ZIP from GitHub: {e}")
-    return None
-
-def _load_local_zip():
-    """Loads local snapshots.zip if it exists."""
-    if os.path.exists(ZIP_PATH_LOCAL):
-        return zipfile.ZipFile(ZIP_PATH_LOCAL, "r")
-    return None
+class _LRU:
+    """Small thread-safe LRU mapping for decoded snapshots."""
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+# --- Backends ---
+def make_backend(name):
+    """Builds the snapshot backend called name from the config above."""
+    if name == "sqlite":
+        return SQLiteBackend(DB_PATH_LOCAL, legacy_zip=ZIP_PATH_LOCAL, legacy_files=FILES_DIR_LOCAL)
+    if name == "dir":
+        return DirBackend(FILES_DIR_LOCAL, legacy_zip=ZIP_PATH_LOCAL)
+    if name == "zip":
+        return ZipBackend(ZIP_PATH_LOCAL)
+    if name == "github":
+        return GitHubBackend(
+            GITHUB_OWNER, GITHUB_REPO, GITHUB_BRANCH, GITHUB_TOKEN,
+            GITHUB_API_URL, GITHUB_RAW_URL,
+            zip_path=f"data/snapshots/{ZIP_FILENAME}",
+            files_dir=REMOTE_FILES_DIR,
+            sync_mode=SNAPSHOT_SYNC_MODE,
+            state_path=SYNC_STATE_PATH,
+            zip_ttl=REMOTE_ZIP_TTL,
+        )
+    raise ValueError(f"Unknown snapshot backend: {name}")
+
+SNAPSHOT_STORE = make_backend(SNAPSHOT_BACKEND)
+REMOTE_STORE = make_backend("github") if SNAPSHOT_REMOTE == "github" and SNAPSHOT_BACKEND != "github" else None
+SNAPSHOT_CACHE = _LRU(SNAPSHOT_CACHE_SIZE)
+DIGEST_CACHE = _LRU(SNAPSHOT_CACHE_SIZE)
+HISTORY = SnapshotHistory(HISTORY_PATH) if SNAPSHOT_HISTORY else None
 
 # --- Snapshot Loading ---
+def refresh_snapshots():
+    """
+    Forgets the decoded snapshots and digests cached in-process, and what the
+    local store read ahead, since other processes (or the remote) may have
+    saved newer ones. Call at the start of each sweep.
+    """
+    SNAPSHOT_CACHE.clear()
+    DIGEST_CACHE.clear()
+    SNAPSHOT_STORE.refresh()
+    if REMOTE_STORE is not None:
+        REMOTE_STORE.refresh() # Retry keys it missed (or timed out on) last time
+
 def load_previous_snapshot(company_name, url_type):
     key = get_snapshot_key(company_name, url_type)
 
-    # 1. Try local zip
-    local_zip = _load_local_zip()
-    if local_zip and key in local_zip.namelist():
-        with local_zip.open(key) as f:
-            return json.load(f)
+    # 1. Try in-process cache
+    data = SNAPSHOT_CACHE.get(key)
+    if data is not None:
+        return data
+
+    # 2. Try local store, then 3. the remote (zip downloaded once per TTL)
+    data = SNAPSHOT_STORE.get(key)
+    if data is None and REMOTE_STORE is not None:
+        data = REMOTE_STORE.get(key)
+    if data is None:
+        return []
+
+    SNAPSHOT_CACHE.put(key, data)
+    return data
+
+def load_previous_digests(company_name, url_type):
+    """Item digests of the previous snapshot as a frozenset, for detect_new_items."""
+    key = get_snapshot_key(company_name, url_type)
+
+    digests = DIGEST_CACHE.get(key)
+    if digests is not None:
+        return digests
 
-    # 2. Try GitHub zip
-    gh_zip = _load_zip_from_github()
-    if gh_zip and key in gh_zip.namelist():
-        with gh_zip.open(key) as f:
-            return json.load(f)
+    blob = SNAPSHOT_STORE.get_digests(key)
+    if blob is None and REMOTE_STORE is not None:
+        blob = REMOTE_STORE.get_digests(key)
+    digests = unpack_digests(blob or b"")
 
-    return []
+    DIGEST_CACHE.put(key, digests)
+    return digests
 
 # --- Snapshot Saving ---
 def save_snapshot(company_name, url_type, data):
-    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
-
-    # Ensure local zip exists (create if missing)
-    if not os.path.exists(ZIP_PATH_LOCAL):
-        with zipfile.ZipFile(ZIP_PATH_LOCAL, "w") as _:
-            pass
+    """
+    Stores data as the latest snapshot and appends what changed to HISTORY.
+    Timed as the "save" and "history" stages.
+    """
+    key = get_snapshot_key(company_name, url_type)
+    if HISTORY is not None:
+        with METRICS.timer("history"):
+            # The snapshot saved before history existed, if any, becomes its base
+            HISTORY.record(
+                key, company_name, url_type, data,
+                seed=lambda: load_previous_snapshot(company_name, url_type), legacy=_legacy_digests,
+            )
+    with METRICS.timer("save"):
+        SNAPSHOT_STORE.put(key, data)
+    SNAPSHOT_CACHE.put(key, data)
+    DIGEST_CACHE.put(key, unpack_digests(pack_digests(data)))
+    UPDATED_FILES.add(key)
+    METRICS.count("snapshots_saved")
 
-    # Create a temp buffer to rewrite ZIP with updated JSON
-    buffer = BytesIO()
+def restage_snapshot(company_name, url_type, data=None):
+    """
+    Queues a snapshot saved by an interrupted or unpushed sweep for the next
+    push. A store that wrote it through already has it (or a newer one), so
+    data, when given, is only saved again if the store could have lost it.
+    """
     key = get_snapshot_key(company_name, url_type)
+    if not SNAPSHOT_STORE.buffered and SNAPSHOT_STORE.get_digests(key) is not None:
+        UPDATED_FILES.add(key)
+    elif data is not None:
+        save_snapshot(company_name, url_type, data)
 
-    with zipfile.ZipFile(ZIP_PATH_LOCAL, "r") as old_zip, \
-         zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as new_zip:
-        # Copy over everything except the updated file
-        for item in old_zip.namelist():
-            if item != key:
-                new_zip.writestr(item, old_zip.read(item))
-        # Write the updated JSON
-        new_zip.writestr(key, json.dumps(data, indent=2))
+def compact_history():
+    """Folds history past its retention window, at most once per HISTORY_COMPACT_EVERY; call once per sweep."""
+    if HISTORY is not None:
+        with METRICS.timer("compact"):
+            HISTORY.compact_if_due()
 
-    # Save updated ZIP locally
-    with open(ZIP_PATH_LOCAL, "wb") as f:
-        f.write(buffer.getvalue())
+# --- Extraction Profiles ---
+def load_profiles(path=PROFILES_PATH):
+    """
+    Compiles the extraction profiles in path, laid out as
+    {company: {url_type: {"container": ..., "title": ..., "link": ..., "date": ..., "syntax": "css"}}}.
+    Returns {(company, url_type): ExtractionProfile}; load once per sweep.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except ValueError as e:
+        print(f"⚠️ Could not read extraction profiles {path}: {e}")
+        return {}
 
-    UPDATED_FILES.add(key)
+    profiles = {}
+    for company, pages in raw.items():
+        for url_type, data in pages.items():
+            try:
+                profiles[(company, url_type)] = ExtractionProfile.from_dict(data)
+            except Exception as e:
+                print(f"⚠️ Skipping extraction profile for {company} ({url_type}): {e}")
+    return profiles
 
 # --- Hashing & Change Detection ---
-def hash_item(item):
-    data = f"{item.get('title','')}|{item.get('timestamp','')}|{item.get('link','')}"
-    return hashlib.md5(data.encode('utf-8')).hexdigest()
+# Characters pages may also have written as decimal entities (e.g. WordPress' &#038; and &#039;)
+_ASCII_ENTITIES = str.maketrans({"&": "&#38;", "'": "&#39;", '"': "&#34;"})
+
+def _legacy_digests(item):
+    """
+    Digests item may have been stored under when clean_html ran over raw
+    markup: links lost their numbers, and so did decimal entities in titles
+    (AbbVie&#8217;s became AbbVie&#;s). Which characters a page escaped is
+    unknown, so titles are rebuilt with every non-ASCII character escaped,
+    and with & ' " escaped as well.
+    """
+    title = item.get('title', '')
+    link = clean_html(item.get('link', ''))
+    digests = {
+        item_digest(dict(item, title=legacy_title, link=link))
+        for legacy_title in (
+            title,
+            clean_html(title.encode('ascii', 'xmlcharrefreplace').decode('ascii')),
+            clean_html(title.translate(_ASCII_ENTITIES).encode('ascii', 'xmlcharrefreplace').decode('ascii')),
+        )
+    }
+    digests.discard(item_digest(item))
+    return digests
 
 def detect_new_items(previous, current):
-    prev_hashes = set(hash_item(item) for item in previous)
-    return [item for item in current if hash_item(item) not in prev_hashes]
-
-# --- Push ZIP if changed ---
-def push_bulk_snapshots():
-    if not UPDATED_FILES:
-        print("No changes detected — skipping push.")
-        return
-
-    # Encode new ZIP
-    with open(ZIP_PATH_LOCAL, "rb") as f:
-        new_zip_data = f.read()
-    encoded_content = base64.b64encode(new_zip_data).decode("utf-8")
-
-    # Check remote SHA
-    github_zip_path = f"data/snapshots/{ZIP_FILENAME}"
-    api_url = f"https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/contents/{github_zip_path}"
-    headers = {"Authorization": f"token {GITHUB_TOKEN}"}
-    response = requests.get(api_url, headers=headers)
-    sha = response.json().get("sha") if response.status_code == 200 else None
-
-    # Push if contents differ
-    push = True
-    if sha:
-        remote_content = requests.get(f"https://raw.githubusercontent.com/{GITHUB_OWNER}/{GITHUB_REPO}/{GITHUB_BRANCH}/{github_zip_path}")
-        if remote_content.status_code == 200 and remote_content.content == new_zip_data:
-            print("✅ Remote ZIP matches local — no push needed.")
-            push = False
-
-    if push:
-        commit_data = {
-            "message": "Bulk snapshot update (zip)",
-            "content": encoded_content,
-            "branch": GITHUB_BRANCH
-        }
-        if sha:
-            commit_data["sha"] = sha
-
-        put_response = requests.put(api_url, headers=headers, json=commit_data)
-        if put_response.status_code not in [200, 201]:
-            print(f"❌ Failed to push ZIP: {put_response.text}")
-        else:
-            print("✅ Bulk snapshots pushed to GitHub.")
+    """
+    Items of current not present in previous. previous may be a list of items
+    or a set of digests from load_previous_digests (no re-hashing needed).
+    An item also counts as seen if it matches a snapshot saved before text
+    nodes were normalized after parsing (see _legacy_digests), so upgrading
+    does not flag every page as changed.
+    """
+    if isinstance(previous, (set, frozenset)):
+        prev_digests = previous
+    else:
+        prev_digests = set(item_digest(item) for item in previous)
+    if not prev_digests: # First snapshot: everything is new, no legacy forms to check
+        return list(current)
+    return [
+        item for item in current
+        if item_digest(item) not in prev_digests and prev_digests.isdisjoint(_legacy_digests(item))
+    ]
+
+# --- Push to GitHub ---
+_PUSH_LOCK = threading.Lock()
+
+def _push_updated(on_pushed=None):
+    with _PUSH_LOCK:
+        keys = set(UPDATED_FILES)
+        if keys:
+            with METRICS.timer("push"):
+                pushed = REMOTE_STORE.push(keys, SNAPSHOT_STORE)
+            METRICS.count("pushes" if pushed else "push_failures")
+            if not pushed:
+                return
+            UPDATED_FILES.difference_update(keys)
+    if on_pushed is not None:
+        on_pushed()
+
+def push_bulk_snapshots(background=None, on_pushed=None):
+    """
+    Flushes the local store and publishes UPDATED_FILES to the remote. With
+    background=True (or SNAPSHOT_BACKGROUND_SYNC) the push runs on a thread,
+    which is returned. on_pushed() is called (on that thread, if any) once
+    nothing is left to push, i.e. unless the push fails. Timed as the
+    "flush" (e.g. the zip rewrite, or the GitHub store's push) and "push"
+    stages.
+    """
+    with METRICS.timer("flush"):
+        SNAPSHOT_STORE.flush()
+
+    if REMOTE_STORE is None or not UPDATED_FILES:
+        if REMOTE_STORE is not None:
+            print("No changes detected — skipping push.")
+        elif SNAPSHOT_BACKEND != "github": # A GitHub store already pushed on flush()
+            print("Local-only snapshot mode — skipping push.")
+        if on_pushed is not None:
+            on_pushed()
+        return None
+
+    if background is None:
+        background = SNAPSHOT_BACKGROUND_SYNC
+    if not background:
+        _push_updated(on_pushed)
+        return None
+
+    thread = threading.Thread(target=copy_context().run, args=(_push_updated, on_pushed), name="snapshot-push")
+    thread.start()
+    return thread
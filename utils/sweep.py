@@ -0,0 +1,296 @@
+# To run a sweep without a UI: config sheet rows in, one structured result per row out
+"""
+Usage: python -m utils.sweep competitors.csv [--json] [--no-push] [--restart] [--report report.json]
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from openpyxl import load_workbook
+from utils.fetcher import NOT_MODIFIED, VALIDATORS, save_fetch_state
+from utils.journal import SweepJournal, row_key
+from utils.metrics import METRICS, SweepReport
+from utils.pipeline import sweep_pages
+from utils.storage import (
+    compact_history, detect_new_items, load_previous_digests, load_profiles, push_bulk_snapshots, refresh_snapshots,
+    restage_snapshot, save_snapshot,
+)
+
+REQUIRED_COLUMNS = ("url", "company", "url type")
+
+# Row result statuses
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+ERROR = "error"
+
+# --- Config sheets ---
+def _csv_records(source):
+    """Yields the header, then every record."""
+    binary = open(source, "rb") if isinstance(source, str) else source
+    text = io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+    reader = csv.reader(text)
+    try:
+        yield next(reader, [])
+        yield from reader
+    finally:
+        text.detach() # Leave an uploaded file object open for its owner
+        if binary is not source:
+            binary.close()
+
+def _xlsx_records(source):
+    """Yields the header, then every record."""
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        yield next(rows, ())
+        yield from rows
+    finally:
+        workbook.close()
+
+def read_rows(source, filename=None):
+    """
+    Reads a CSV or XLSX config sheet (a path or binary file object, read from
+    the start; filename, default source's name, picks the format). Checks the
+    header right away, matching column names case-insensitively, and raises
+    ValueError if a required column is missing. Returns a generator of
+    {"url", "company", "url type"} dicts with surrounding whitespace stripped,
+    skipping blank rows.
+    """
+    if hasattr(source, "seek"):
+        source.seek(0)
+    name = (filename or getattr(source, "name", None) or str(source)).lower()
+    records = _xlsx_records(source) if name.endswith((".xlsx", ".xlsm")) else _csv_records(source)
+
+    header = [str(column or "").strip().lower() for column in next(records)]
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        records.close()
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+    index = {column: header.index(column) for column in REQUIRED_COLUMNS}
+
+    def rows():
+        for record in records:
+            row = {
+                column: "" if i >= len(record) or record[i] is None else str(record[i]).strip()
+                for column, i in index.items()
+            }
+            if any(row.values()): # Skip blank lines
+                yield row
+    return rows()
+
+def count_rows(source, filename=None):
+    """
+    The number of rows read_rows yields, from a pass that only reads the
+    sheet, for a progress bar's denominator. A file object is rewound after.
+    """
+    try:
+        return sum(1 for _ in read_rows(source, filename))
+    finally:
+        if hasattr(source, "seek"):
+            source.seek(0)
+
+# --- Engine ---
+def _result(row, status, message, source=None, status_code=None, new_items=None):
+    return {
+        "company": row["company"],
+        "url_type": row["url type"],
+        "url": row["url"],
+        "status": status,
+        "message": message,
+        "source": source,
+        "status_code": status_code,
+        "new_items": new_items or [],
+        "resumed": False,
+    }
+
+def process_page(row, page, source, status_code):
+    """Diffs and saves one row's extracted page (see sweep_pages). Returns its result."""
+    c, t = row["company"], row["url type"]
+
+    if status_code == NOT_MODIFIED:
+        # Page identical to the last sweep - nothing to parse or diff
+        return _result(row, UNCHANGED, "No Change", source, status_code)
+
+    if page is None:
+        if status_code == 404:
+            message = f"Error {status_code}. Website does not exist."
+        elif status_code == 403:
+            message = f"Error {status_code}. Forbidden (bot detected)."
+        elif status_code:
+            message = f"Error {status_code}. Failed to fetch, please check URL manually."
+        else:
+            message = source # The fetch error
+        return _result(row, ERROR, message, source, status_code)
+
+    items, error = page
+    if error:
+        VALIDATORS.forget(row["url"]) # Re-parse next time instead of reporting "No Change"
+        return _result(row, ERROR, f"Could not extract structured content: {error}", source, status_code)
+
+    with METRICS.timer("diff"):
+        new_items = detect_new_items(load_previous_digests(c, t), items)
+    save_snapshot(c, t, items)
+    if new_items:
+        return _result(row, CHANGED, "Changed", source, status_code, new_items)
+    return _result(row, UNCHANGED, "No Change", source, status_code)
+
+def run_sweep(rows, profiles=None, push=True, journal=None, report=None):
+    """
+    Sweeps row dicts (see read_rows), yielding each row's result as soon as
+    it is diffed and saved:
+        {"company", "url_type", "url", "status": CHANGED | UNCHANGED | ERROR,
+         "message", "source", "status_code", "new_items", "resumed"}
+    Fetch state is saved, and snapshots pushed if push, when the sweep ends,
+    including when the caller stops early.
+
+    With a SweepJournal, every saved row is checkpointed. If an earlier run
+    of the same journal died partway, the rows it finished are not fetched
+    again: their results come first, marked resumed, and their snapshots are
+    staged again so this sweep's push includes them. Failed rows are retried.
+    A sweep that ran to the end is marked complete; if its push then fails
+    or never runs, later runs refetch every row but still stage its
+    snapshots again. The journal is cleared once a push succeeds (by the
+    push thread, with SNAPSHOT_BACKGROUND_SYNC).
+
+    Stage timings and counters (see utils.metrics) go into report, a
+    SweepReport (a new one by default), which is saved as JSON under
+    metrics.REPORT_DIR when the sweep ends.
+    """
+    report = (report or SweepReport()).start()
+    refresh_snapshots() # Another process may have saved since the last sweep
+    profiles = load_profiles() if profiles is None else profiles # Compiled once per sweep
+    completed = journal.open() if journal is not None else {}
+    finished = False
+
+    try:
+        if journal is not None:
+            for result, items in journal.pending.values(): # Saved by a completed run whose push failed
+                restage_snapshot(result["company"], result["url_type"], items)
+        jobs = []
+        for row in rows:
+            done = completed.get(row_key(row)) if completed else None
+            if done is None:
+                if not load_previous_digests(row["company"], row["url type"]):
+                    # Validators are per URL; with no snapshot for this row, a 304 would leave it without one
+                    VALIDATORS.forget(row["url"])
+                jobs.append((row, row["url"], profiles.get((row["company"], row["url type"]))))
+                continue
+            result, items = done
+            restage_snapshot(row["company"], row["url type"], items) # Stage the unpushed update again
+            result = dict(result, resumed=True)
+            report.result(result)
+            yield result
+        del completed
+
+        for row, page, source, status_code in sweep_pages(jobs):
+            try:
+                result = process_page(row, page, source, status_code)
+            except Exception as error:
+                VALIDATORS.forget(row["url"])
+                result = _result(row, ERROR, f"Error {error}", source, status_code)
+            if journal is not None and result["status"] != ERROR:
+                # Items only for changed rows, in case a buffered store loses them; the rest are in the store already
+                journal.record(row, result, page[0] if result["status"] == CHANGED else None)
+            del page
+            report.result(result)
+            yield result
+        finished = True
+    finally:
+        save_fetch_state()
+        compact_history()
+        if journal is None or not finished:
+            if journal is not None:
+                journal.close() # Kept, so a rerun resumes and stages the updates again
+            if push:
+                push_bulk_snapshots()
+        elif push:
+            journal.complete()
+            push_bulk_snapshots(on_pushed=journal.finish)
+        else:
+            journal.finish()
+        report.finish()
+        report.save()
+
+def format_text(result):
+    """Plain-text report of one result, as printed by the CLI and main.py."""
+    verb = "Resumed" if result.get("resumed") else "Accessing"
+    lines = [f"{verb} ({result['company']}, {result['url_type']}): {result['url']}"]
+    if result["status"] == ERROR:
+        lines.append(f" 🚨 Failure: {result['message']}")
+    elif result["status_code"] == NOT_MODIFIED:
+        lines.append(f"Unchanged ({result['source']}): {result['company']}")
+        lines.append("  ✅ No new content since last check.")
+    elif result["new_items"]:
+        lines.append(f"Success ({result['source']}): {result['company']}")
+        lines.append(f"  🆕 {len(result['new_items'])} new item(s) found:")
+        for item in result["new_items"]:
+            lines.append(f"    - {item['title']} ({item['timestamp']})")
+            lines.append(f"      Link: {item['link']}")
+    else:
+        lines.append(f"Success ({result['source']}): {result['company']}")
+        lines.append("  ✅ No new content since last check.")
+    return "\n".join(lines) + "\n"
+
+def format_report(report):
+    """Plain-text summary of a SweepReport's to_dict()."""
+    lines = [f"Swept {report['rows']} row(s) in {report['seconds']:.1f} s"]
+    for stage, stats in report["stages"].items():
+        lines.append(
+            f"  {stage:<18} {stats['calls']:>6} calls {stats['total_s']:>9.2f} s"
+            f"   p50 {stats['p50_ms']:.1f} ms   p95 {stats['p95_ms']:.1f} ms"
+        )
+    counters = report["counters"]
+    lines.append(
+        f"  {counters.get('fetch_bytes', 0) / 1e6:.1f} MB downloaded, "
+        f"{counters.get('items_extracted', 0)} items extracted, "
+        f"{counters.get('snapshot_bytes', 0) / 1e6:.1f} MB of snapshots written"
+    )
+    if report["fallback_rate"] is not None:
+        lines.append(f"  cloudscraper fallback on {report['fallback_rate']:.0%} of fetches")
+    if report.get("route_hit_rate") is not None:
+        lines.append(
+            f"  first backend tried served {report['route_hit_rate']:.0%} of pages"
+            f" (curl_cffi skipped {counters.get('curl_skips', 0)} time(s))"
+        )
+    if report["peak_traced_mb"] is not None:
+        lines.append(f"  peak traced memory {report['peak_traced_mb']} MB")
+    return "\n".join(lines)
+
+# --- CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a change-detection sweep over a CSV/XLSX config sheet.")
+    parser.add_argument("sheet", help="CSV or XLSX with URL, Company and URL Type columns")
+    parser.add_argument("--json", action="store_true", help="print one JSON result per line")
+    parser.add_argument("--no-push", action="store_true", help="do not push snapshots to the remote")
+    parser.add_argument("--restart", action="store_true", help="ignore an interrupted run's checkpoint and sweep every row")
+    parser.add_argument("--report", help="also write the sweep's timing report (JSON) to this path")
+    args = parser.parse_args(argv)
+
+    try:
+        rows = read_rows(args.sheet)
+    except (OSError, ValueError) as e:
+        print(f"❌ Could not read {args.sheet}: {e}", file=sys.stderr)
+        return 2
+
+    counts = {CHANGED: 0, UNCHANGED: 0, ERROR: 0}
+    journal = SweepJournal(os.path.basename(args.sheet))
+    if args.restart:
+        journal.reset()
+    report = SweepReport()
+    for result in run_sweep(rows, push=not args.no_push, journal=journal, report=report):
+        counts[result["status"]] += 1
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False), flush=True)
+        else:
+            print(format_text(result), flush=True)
+
+    print(f"{counts[CHANGED]} changed, {counts[UNCHANGED]} unchanged, {counts[ERROR]} errors", file=sys.stderr)
+    print(format_report(report.to_dict()), file=sys.stderr)
+    if args.report:
+        report.save(args.report)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())